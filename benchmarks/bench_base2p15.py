@@ -0,0 +1,59 @@
+"""
+Throughput of the base2p15 codecs in sthir.generate_search.
+
+Compares the binary string based base2p15_encode/base2p15_decode with
+base2p15_encode_bytes/base2p15_decode_bytes on random filters.
+
+Usage (from the repository root): python -m benchmarks.bench_base2p15 [--sizes 1000 100000] [--repeat 5]
+"""
+import argparse
+import os
+import timeit
+
+from bitarray import bitarray
+
+from sthir.generate_search import (base2p15_decode, base2p15_decode_bytes,
+                                   base2p15_encode, base2p15_encode_bytes)
+
+
+def bench(n_bytes: int, repeat: int) -> dict:
+    """
+    Times every codec on a random buffer of n_bytes
+
+    :returns: Dictionary with the best time per call (seconds) and MB/s for each codec
+    """
+    packed = os.urandom(n_bytes)
+    bits = bitarray()
+    bits.frombytes(packed)
+    encoded = base2p15_encode_bytes(packed)
+    assert encoded == base2p15_encode(bits.to01())
+
+    cases = {
+        "encode (to01 + str)": lambda: base2p15_encode(bits.to01()),
+        "encode (bytes)": lambda: base2p15_encode_bytes(packed),
+        "decode (str)": lambda: base2p15_decode(encoded),
+        "decode (bytes)": lambda: base2p15_decode_bytes(encoded),
+    }
+    results = {}
+    for name, func in cases.items():
+        best = min(timeit.repeat(func, number=1, repeat=repeat))
+        results[name] = (best, n_bytes / best / 1e6)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="base2p15 codec throughput")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1000, 10000, 100000, 1000000],
+                        help="Filter sizes in bytes")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print("{:>10}  {:<22}{:>12}{:>12}".format("bytes", "codec", "seconds", "MB/s"))
+    for size in args.sizes:
+        for name, (seconds, throughput) in bench(size, args.repeat).items():
+            print("{:>10}  {:<22}{:>12.6f}{:>12.2f}".format(size, name, seconds, throughput))
+
+
+if __name__ == "__main__":
+    main()
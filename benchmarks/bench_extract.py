@@ -0,0 +1,60 @@
+"""
+Documents per second of the HTML text extraction backends in sthir.parse.
+
+Every backend produces the tokens and the title of each page, the way
+scan.generate_bloom_filter consumes them. The default corpus is the
+Sphinx documentation pages shipped in docs/.
+
+Usage (from the repository root): python -m benchmarks.bench_extract [corpus_dir] [--repeat 3]
+"""
+import argparse
+import glob
+import os
+import time
+
+from sthir.parse import BACKENDS, parse_html
+
+
+def bench(files: list, backend: str, repeat: int) -> float:
+    """
+    Returns the best documents/second of the backend over the files
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for file in files:
+            tokens, _ = parse_html(file, backend=backend, remove_stopwords=True)
+            for _ in tokens:
+                pass
+        best = min(best, time.perf_counter() - start)
+    return len(files) / best
+
+
+def main():
+    default_corpus = os.path.join(os.path.dirname(__file__), os.pardir, "docs")
+    parser = argparse.ArgumentParser(description="HTML extraction backends throughput")
+    parser.add_argument("corpus", nargs="?", default=default_corpus,
+                        help="Directory of .html pages (default: docs/)")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(args.corpus, "*.html")))
+    if not files:
+        parser.error("no .html files in {}".format(args.corpus))
+
+    print("{} pages from {}".format(len(files), os.path.abspath(args.corpus)))
+    print("{:<12}{:>12}".format("backend", "docs/s"))
+    for backend in args.backends:
+        try:
+            rate = bench(files, backend, args.repeat)
+        except LookupError as e:
+            # newspaper needs the NLTK punkt models
+            reason = next(line for line in str(e).splitlines() if line.strip("* "))
+            print("{:<12}{:>12}  ({})".format(backend, "skipped", reason.strip()))
+            continue
+        print("{:<12}{:>12.1f}".format(backend, rate))
+
+
+if __name__ == "__main__":
+    main()
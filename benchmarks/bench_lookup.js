@@ -0,0 +1,56 @@
+// Counter lookups per second in a generated search page.
+//
+// Compares the per-lookup path (base2p15_get_chunk + bin_to_integer, which
+// re-decodes a padded substring for every counter) with indexed reads from
+// the counters decoded once by bitArray.decode_counters.
+//
+// Usage: node benchmarks/bench_lookup.js search.html [lookups]
+// (python -m benchmarks.bench_lookup builds a synthetic page and runs this)
+const fs = require("fs");
+const vm = require("vm");
+
+const page = process.argv[2];
+const lookups = parseInt(process.argv[3] || "200000", 10);
+const html = fs.readFileSync(page, "utf8");
+// The search engine script and the page script, run together as when workers are not available
+const script = [...html.matchAll(/<script[^>]*>([\s\S]*?)<\/script>/g)].map(match => match[1]).join("\n");
+
+const element = {value: "", innerHTML: "", addEventListener() {}};
+const context = {console: {log() {}}, document: {getElementById: () => element}};
+vm.createContext(context);
+
+let start = process.hrtime.bigint();
+vm.runInContext(script + "\n;globalThis.documents_loaded = bit_arrs;", context);
+const load_ms = Number(process.hrtime.bigint() - start) / 1e6;
+const filters = context.documents_loaded.filter(doc => doc.counters !== undefined);
+if (filters.length == 0) {
+    throw "The page has no per-document filters (bit-sliced pages are not supported)";
+}
+
+function bench(name, lookup) {
+    let checksum = 0;
+    let begin = process.hrtime.bigint();
+    for (var i = 0; i < lookups; i++) {
+        let doc = filters[i % filters.length];
+        checksum += lookup(doc, (i * 2654435761) % doc.m);
+    }
+    let seconds = Number(process.hrtime.bigint() - begin) / 1e9;
+    console.log(name.padEnd(32) + String(Math.round(lookups / seconds)).padStart(14) + " lookups/s");
+    return checksum;
+}
+
+console.log(filters.length + " filters, page script loaded and decoded in " + load_ms.toFixed(1) + " ms");
+bench("base2p15_get_chunk + bin_to_int", (doc, i) => doc.bin_to_integer(doc.base2p15_get_chunk(i)));
+bench("decoded counters", (doc, i) => doc.counters[i]);
+
+// base2p15_get_range can return an empty range for counters ending in the
+// last characters of a filter, the decoded counters are read correctly
+let mismatches = 0;
+for (const doc of filters) {
+    for (var i = 0; i < doc.m; i++) {
+        if (doc.counters[i] != doc.bin_to_integer(doc.base2p15_get_chunk(i))) {
+            mismatches += 1;
+        }
+    }
+}
+console.log("counters read differently by the two paths: " + mismatches);
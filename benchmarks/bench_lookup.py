@@ -0,0 +1,53 @@
+"""
+Builds a synthetic search page and runs benchmarks/bench_lookup.js on it with node,
+comparing counter lookups per second of the generated search JS.
+
+Usage (from the repository root): python -m benchmarks.bench_lookup [--documents 50] [--words 2000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import string
+import subprocess
+import tempfile
+
+import sthir.scan as scan
+
+
+def write_corpus(directory: str, documents: int, words: int, seed: int = 0) -> None:
+    """
+    Writes documents random HTML pages of words tokens each to directory
+    """
+    rng = random.Random(seed)
+    vocabulary = [
+        "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10)))
+        for _ in range(5 * words)
+    ]
+    for doc in range(documents):
+        body = " ".join(rng.choice(vocabulary) for _ in range(words))
+        with open(os.path.join(directory, "doc{:05d}.html".format(doc)), "w", encoding="utf8") as f:
+            f.write("<html><head><title>Document {}</title></head><body><p>{}</p></body></html>".format(doc, body))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search page counter lookups per second")
+    parser.add_argument("--documents", type=int, default=50)
+    parser.add_argument("--words", type=int, default=2000, help="Tokens per document")
+    parser.add_argument("--lookups", type=int, default=200000)
+    parser.add_argument("--chunk-size", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_corpus(tmp, args.documents, args.words)
+        page = os.path.join(tmp, "search.html")
+        with contextlib.redirect_stdout(io.StringIO()):
+            scan.create_search_page(tmp, output_file=page, false_positive=0.01,
+                                    chunk_size=args.chunk_size, remove_stopwords=False)
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_lookup.js")
+        subprocess.run(["node", script, page, str(args.lookups)], check=True)
+
+
+if __name__ == "__main__":
+    main()
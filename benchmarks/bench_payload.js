@@ -0,0 +1,58 @@
+// Load time of the filters of a generated search page.
+//
+// Runs the page script and waits until every filter is decoded, which for
+// compressed pages includes fetching and decompressing the gzip blobs.
+// With a JSON file of base64 strings (the encoding of sthir/convert_byte.py)
+// instead of a page, times decoding them with atob.
+//
+// Usage: node benchmarks/bench_payload.js search.html|filters.json [repeats]
+// (python -m benchmarks.bench_payload builds the pages and runs this)
+const fs = require("fs");
+const path = require("path");
+const vm = require("vm");
+
+const file = process.argv[2];
+const repeats = parseInt(process.argv[3] || "5", 10);
+
+function read_file(name) {
+    return Promise.resolve(new Response(fs.readFileSync(path.join(path.dirname(file), name))));
+}
+
+async function load_page() {
+    // The search engine script and the page script, run together as when workers are not available
+    const script = [...fs.readFileSync(file, "utf8").matchAll(/<script[^>]*>([\s\S]*?)<\/script>/g)]
+        .map(match => match[1]).join("\n");
+    const element = {value: "", innerHTML: "", addEventListener() {}};
+    const context = {
+        console: {log() {}}, document: {getElementById: () => element},
+        Response, DecompressionStream, TextDecoder,
+        fetch: name => name.startsWith("data:") ? fetch(name) : read_file(name),
+    };
+    vm.createContext(context);
+    vm.runInContext(script, context);
+    if (vm.runInContext("typeof manifest", context) !== "undefined") {
+        await vm.runInContext("Promise.all(manifest.shards.map((shard, i) => load_shard(i)))", context);
+    }
+    return vm.runInContext("bit_arrs.length", context);
+}
+
+async function load_base64() {
+    let bytes = 0;
+    for (const filter of JSON.parse(fs.readFileSync(file, "utf8"))) {
+        bytes += atob(filter).length;
+    }
+    return bytes;
+}
+
+async function main() {
+    const load = file.endsWith(".json") ? load_base64 : load_page;
+    let best = Infinity;
+    for (var i = 0; i < repeats; i++) {
+        const start = process.hrtime.bigint();
+        await load();
+        best = Math.min(best, Number(process.hrtime.bigint() - start) / 1e6);
+    }
+    console.log(best.toFixed(2));
+}
+
+main();
@@ -0,0 +1,95 @@
+"""
+Compares the payload size and load time of the filter encodings of a search page:
+raw base2p15 text, base64 (the encoding of sthir/convert_byte.py) and gzip compressed
+filters, inlined or sharded. "gzip" is the size served with HTTP compression and
+"load" the best time of node (benchmarks/bench_payload.js) to decode every filter.
+
+Usage (from the repository root): python -m benchmarks.bench_payload [--documents 50] [--words 2000]
+"""
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import subprocess
+import tempfile
+
+import sthir.convert_2p15 as convert_2p15
+import sthir.scan as scan
+from benchmarks.bench_lookup import write_corpus
+
+MODES = (
+    ("base2p15", {}),
+    ("base2p15, elias", {"counter_format": "elias"}),
+    ("gzip", {"compress": True}),
+    ("gzip, elias", {"compress": True, "counter_format": "elias"}),
+    ("gzip shards", {"compress": True, "shard_size": 10}),
+)
+
+
+def payload_files(page):
+    """
+    Returns the search page and its shards
+    """
+    shard_dir = scan.get_shard_dir(page)
+    shards = sorted(os.listdir(shard_dir)) if os.path.isdir(shard_dir) else []
+    return [page] + [os.path.join(shard_dir, shard) for shard in shards]
+
+
+def measure(files, load_file, repeats):
+    """
+    Returns the total size, total size once served gzip compressed, and load time in ms
+    """
+    size = sum(os.path.getsize(file) for file in files)
+    served = 0
+    for file in files:
+        with open(file, "rb") as f:
+            served += len(scan.gzip_bytes(f.read(), compresslevel=6))
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_payload.js")
+    result = subprocess.run(["node", script, load_file, str(repeats)],
+                            check=True, capture_output=True, text=True)
+    return size, served, float(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search page payload size and load time")
+    parser.add_argument("--documents", type=int, default=50)
+    parser.add_argument("--words", type=int, default=2000, help="Tokens per document")
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument("--chunk-size", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as corpus, tempfile.TemporaryDirectory() as tmp:
+        write_corpus(corpus, args.documents, args.words)
+        rows = list()
+        for name, options in MODES:
+            page = os.path.join(tmp, name.replace(", ", "_").replace(" ", "_") + ".html")
+            with contextlib.redirect_stdout(io.StringIO()):
+                scan.create_search_page(corpus, output_file=page, false_positive=args.error_rate,
+                                        chunk_size=args.chunk_size, remove_stopwords=False,
+                                        **options)
+            files = payload_files(page)
+            rows.append((name, ) + measure(files, page, args.repeats))
+
+            if name == "base2p15":
+                # convert_byte.py has no multi-document page, only its encoding of the .bin files is measured
+                filters = list()
+                for file in scan.get_all_html_files(corpus):
+                    with open(file.replace(".html", ".bin"), "rb") as f:
+                        filters.append(base64.b64encode(f.read()).decode("ascii"))
+                filters_file = os.path.join(tmp, "base64.json")
+                with open(filters_file, "w") as f:
+                    json.dump(filters, f)
+                rows.append(("base64 (filters only)", ) + measure([filters_file], filters_file, args.repeats))
+
+    template = len(convert_2p15.HTML_TEMPLATE["HEAD"].encode("utf8"))
+    print("Pages include {} bytes of HTML and JS".format(template))
+    print("{:<24}{:>12}{:>12}{:>12}".format("encoding", "bytes", "gzip", "load ms"))
+    for name, size, served, load in rows:
+        print("{:<24}{:>12}{:>12}{:>12.2f}".format(name, size, served, load))
+
+
+if __name__ == "__main__":
+    main()
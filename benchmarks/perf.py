@@ -0,0 +1,181 @@
+"""
+Timings of the build and query hot paths, with a baseline to catch regressions.
+
+Every case is timed as the best of --repeat runs on synthetic data of growing
+size (a fixed seed, so runs are comparable):
+
+* murmur3_x86_32 and murmur3_x86_32_batch on a vocabulary
+* Spectral_Bloom_Filter.create_filter on token streams, and on a vocabulary under a
+  small byte budget
+* base2p15_encode and base2p15_decode (the binary string codecs), base2p15_encode_bytes,
+  base2p15_decode_bytes and base2p15_get_range on random filters
+* extract_html_bs4 and scan.create_search_page on synthetic corpora
+
+Usage (from the repository root):
+    python -m benchmarks.perf run [--save benchmarks/baseline.json]
+    python -m benchmarks.perf compare [--baseline benchmarks/baseline.json] [--threshold 0.5]
+
+compare exits with status 1 if a case is slower than its baseline by more than
+the threshold (0.5 = 50%). Baselines are only comparable on the same machine, so
+none is kept in the repository: record one locally with "run --save" before
+comparing, and again after changing hardware.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import string
+import sys
+import tempfile
+import timeit
+from typing import Callable, Dict, Iterator, Tuple
+
+import sthir.scan as scan
+from benchmarks.bench_lookup import write_corpus
+from sthir.generate_search import (base2p15_decode, base2p15_decode_bytes, base2p15_encode, base2p15_encode_bytes,
+                                   base2p15_get_range)
+from sthir.mmh3 import murmur3_x86_32, murmur3_x86_32_batch
+from sthir.parse import extract_html_bs4
+from sthir.spectral_bloom_filter import Spectral_Bloom_Filter
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+VERSION = 1
+
+
+def vocabulary(size: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10))) for _ in range(size)]
+
+
+def cases(tmp: str) -> Iterator[Tuple[str, Callable[[], object]]]:
+    """
+    Yields (name, function) of every case, building their inputs in tmp
+    """
+    for size in (1000, 10000):
+        words = vocabulary(size)
+        yield "murmur3_x86_32[{}]".format(size), lambda words=words: [murmur3_x86_32(word) for word in words]
+        yield "murmur3_x86_32_batch[{}x4]".format(size), lambda words=words: murmur3_x86_32_batch(words, range(4))
+
+    for size in (10000, 100000):
+        rng = random.Random(size)
+        words = vocabulary(size // 10)
+        tokens = [rng.choice(words) for _ in range(size)]
+        yield "create_filter[{}]".format(size), lambda tokens=tokens: Spectral_Bloom_Filter().create_filter(
+            tokens, 0.01, to_bitarray=False)
+
+    # A byte budget far below the vocabulary: m is small next to the number of unique words
+    words = vocabulary(200000, seed=1)
+    yield "create_filter[200000,max_bytes=500]", lambda words=words: Spectral_Bloom_Filter().create_filter(
+        words, 0.01, to_bitarray=False, max_bytes=500)
+
+    for size in (10000, 1000000):
+        packed = random.Random(size).getrandbits(8 * size).to_bytes(size, "little")
+        encoded = base2p15_encode_bytes(packed)
+        bit_string = format(int.from_bytes(packed, "big"), "0{}b".format(8 * size))
+        yield "base2p15_encode[{}]".format(size), lambda bit_string=bit_string: base2p15_encode(bit_string)
+        yield "base2p15_decode[{}]".format(size), lambda encoded=encoded: base2p15_decode(encoded)
+        yield "base2p15_encode_bytes[{}]".format(size), lambda packed=packed: base2p15_encode_bytes(packed)
+        yield "base2p15_decode_bytes[{}]".format(size), lambda encoded=encoded: base2p15_decode_bytes(encoded)
+        # 1000 counters of 4 bits spread over the filter
+        starts = range(0, 8 * size - 4, 8 * size // 1000)
+        yield "base2p15_get_range[{}]x1000".format(size), lambda encoded=encoded, starts=starts: [
+            base2p15_get_range(encoded, start, start + 4) for start in starts
+        ]
+
+    for documents in (10, 50):
+        corpus = os.path.join(tmp, "corpus_{}".format(documents))
+        os.makedirs(corpus)
+        write_corpus(corpus, documents, 2000)
+        files = scan.get_all_html_files(corpus)
+        yield "extract_html_bs4[{}]".format(documents), lambda files=files: [
+            extract_html_bs4(file, False) for file in files
+        ]
+        output_file = os.path.join(tmp, "search_{}.html".format(documents))
+
+        def build(corpus=corpus, output_file=output_file):
+            with contextlib.redirect_stdout(io.StringIO()):
+                scan.create_search_page(corpus, output_file=output_file, false_positive=0.01,
+                                        remove_stopwords=False)
+
+        yield "create_search_page[{}]".format(documents), build
+
+
+def measure(repeat: int, only: str = None) -> Dict[str, float]:
+    """
+    Returns the best time in seconds of every case (whose name contains only, if given)
+    """
+    results = dict()
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, func in cases(tmp):
+            if only and only not in name:
+                continue
+            results[name] = min(timeit.repeat(func, number=1, repeat=repeat))
+            print("{:<40}{:>12.6f} s".format(name, results[name]), file=sys.stderr)
+    return results
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> bool:
+    """
+    Prints every case against its baseline
+
+    :returns: False if a case is slower than its baseline by more than threshold
+    """
+    ok = True
+    print("{:<40}{:>12}{:>12}{:>10}".format("case", "baseline s", "current s", "ratio"))
+    for name, seconds in results.items():
+        if name not in baseline:
+            print("{:<40}{:>12}{:>12.6f}{:>10}".format(name, "-", seconds, "new"))
+            continue
+        ratio = seconds / baseline[name]
+        regressed = ratio > 1 + threshold
+        ok = ok and not regressed
+        print("{:<40}{:>12.6f}{:>12.6f}{:>10.2f}{}".format(name, baseline[name], seconds, ratio,
+                                                          "  REGRESSION" if regressed else ""))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Timings of the build and query hot paths")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="Time every case")
+    run_parser.add_argument("--save", metavar="FILE", help="Write the timings as a baseline")
+    compare_parser = subparsers.add_parser("compare", help="Time every case and compare with a baseline")
+    compare_parser.add_argument("--baseline", default=BASELINE)
+    compare_parser.add_argument("--threshold", type=float, default=0.5,
+                                help="Allowed slowdown, 0.5 is 50%% (default)")
+    for sub in (run_parser, compare_parser):
+        sub.add_argument("--repeat", type=int, default=5)
+        sub.add_argument("--only", help="Only the cases whose name contains this")
+    args = parser.parse_args()
+
+    results = measure(args.repeat, args.only)
+    if args.command == "run":
+        print(json.dumps(results, indent=2))
+        if args.save:
+            with open(args.save, "w") as f:
+                json.dump({
+                    "version": VERSION,
+                    "machine": platform.platform(),
+                    "python": platform.python_version(),
+                    "repeat": args.repeat,
+                    "cases": results
+                }, f, indent=2)
+                f.write("\n")
+        return
+
+    if not os.path.exists(args.baseline):
+        sys.exit("No baseline at {}, record one with: python -m benchmarks.perf run --save {}".format(
+            args.baseline, args.baseline))
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("machine") != platform.platform():
+        print("Baseline recorded on {}, timings may not be comparable".format(baseline.get("machine")))
+    if not compare(results, baseline["cases"], args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
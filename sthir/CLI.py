@@ -2,6 +2,8 @@ import argparse
 from pprint import pprint
 from os.path import isdir,abspath
 import sthir.scan as scan
+from sthir.parse import BACKENDS
+from sthir.spectral_bloom_filter import COUNTER_FORMATS, HASHING_SCHEMES
 
 def _dir_path(path):
     """Validates path to the source folder"""
@@ -21,6 +23,17 @@ def _error_rate_arg(val):
         return val
     raise argparse.ArgumentTypeError(f"{val} not in range [0.0, 1.0]")
 
+def _sketch_error_arg(val):
+    """Validates the error target of the document frequency sketch for the arg parser"""
+    try:
+        val = float(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{val} is not a floating-point literal")
+
+    if val > 0.0 and val <= 1.0:
+        return val
+    raise argparse.ArgumentTypeError(f"{val} not in range (0.0, 1.0]")
+
 def _chunk_size_arg(val):
     """Validates the chunk_size for the arg parser"""
     try:
@@ -37,6 +50,50 @@ def _chunk_size_arg(val):
     else:
         raise argparse.ArgumentTypeError(f"{val} is too high")
 
+def _jobs_arg(val):
+    """Validates the number of worker processes for the arg parser"""
+    try:
+        val = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{val} is not an integer value.")
+
+    if val >= 1:
+        return val
+    raise argparse.ArgumentTypeError("Number of jobs has to be greater than zero.")
+
+def _shard_size_arg(val):
+    """Validates the number of documents per shard for the arg parser"""
+    try:
+        val = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{val} is not an integer value.")
+
+    if val >= 0:
+        return val
+    raise argparse.ArgumentTypeError("Shard size cannot be negative.")
+
+def _prefix_length_arg(val):
+    """Validates the longest indexed prefix for the arg parser"""
+    try:
+        val = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{val} is not an integer value.")
+
+    if val >= 0:
+        return val
+    raise argparse.ArgumentTypeError("Prefix length cannot be negative.")
+
+def _bytes_arg(val):
+    """Validates a byte budget for the arg parser"""
+    try:
+        val = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{val} is not an integer value.")
+
+    if val >= 1:
+        return val
+    raise argparse.ArgumentTypeError("Byte budget has to be greater than zero.")
+
 def sthir_arg_parser():
     """
     The CLI function for sthir.
@@ -89,6 +146,141 @@ def sthir_arg_parser():
         help='Disable stopword removal from files (not recommended)'
     )
 
+    #Hashing scheme
+    parser.add_argument(
+        '--hashing',
+        choices=HASHING_SCHEMES,
+        dest='hashing',
+        default='standard',
+        help='How the hash indices are derived, "double" computes only two hashes per word Default:standard'
+    )
+
+    #Worker processes
+    parser.add_argument(
+        '-j', '--jobs',
+        type=_jobs_arg,
+        metavar='N',
+        dest='jobs',
+        default=1,
+        help='Number of processes scanning files in parallel Default:1'
+    )
+
+    #Incremental builds
+    parser.add_argument(
+        '-i', '--incremental',
+        dest='incremental',
+        action='store_true',
+        help='Only rescan files changed since the last build (keeps search.manifest.json)'
+    )
+
+    #Text extraction backend
+    parser.add_argument(
+        '--backend',
+        choices=BACKENDS,
+        dest='backend',
+        default='bs4',
+        help='Library used to extract the text of the files, lxml is the fastest Default:bs4'
+    )
+
+    #Sharded output
+    parser.add_argument(
+        '--shard-size',
+        type=_shard_size_arg,
+        metavar='N',
+        dest='shard_size',
+        default=0,
+        help='Write the filters in files of N documents, fetched by the page when searching Default:0 (inline)'
+    )
+
+    #Index layout
+    parser.add_argument(
+        '--layout',
+        choices=('documents', 'bitsliced'),
+        dest='layout',
+        default='documents',
+        help='One filter per document, or documents grouped under a shared m and k with bit-sliced counters Default:documents'
+    )
+
+    #Counter format
+    parser.add_argument(
+        '--counter-format',
+        choices=COUNTER_FORMATS,
+        dest='counter_format',
+        default='fixed',
+        help='Store counters on chunk_size bits, or as Elias gamma codes which are smaller for sparse filters Default:fixed'
+    )
+
+    #Compressed filters
+    parser.add_argument(
+        '-z', '--compress',
+        dest='compress',
+        action='store_true',
+        help='Store the filters gzip compressed, decompressed by the browser when searching'
+    )
+
+    #Binary index file
+    parser.add_argument(
+        '--index',
+        metavar='FILE',
+        dest='index_file',
+        default=None,
+        help='Also write the filters to a binary index file, searchable with sthir.search_index.SearchIndex'
+    )
+
+    #Byte budget per filter, or of all the filters
+    budget = parser.add_mutually_exclusive_group()
+    budget.add_argument(
+        '--max-bytes',
+        type=_bytes_arg,
+        metavar='N',
+        dest='max_bytes',
+        default=None,
+        help='Largest filter of a document in bytes, larger ones get fewer counters and more false positives Default:no limit'
+    )
+    budget.add_argument(
+        '--total-bytes',
+        type=_bytes_arg,
+        metavar='N',
+        dest='total_bytes',
+        default=None,
+        help='Bytes of all the filters together, spread over the documents to keep false positives lowest Default:no limit'
+    )
+
+    #Prefix filters
+    parser.add_argument(
+        '--prefix-length',
+        type=_prefix_length_arg,
+        metavar='N',
+        dest='prefix_length',
+        default=0,
+        help='Also index the word prefixes of up to N characters, searched as "filt*" Default:0 (off)'
+    )
+
+    parser.add_argument(
+        '--prefix-error-rate',
+        type=_error_rate_arg,
+        metavar='ErrorRate',
+        dest='prefix_false_positive',
+        default=None,
+        help='Error_rate for the prefix filters Range:[0.0,1.0] Default:the error rate of -e'
+    )
+
+    #Document frequencies
+    parser.add_argument(
+        '--df-sketch',
+        action='store_true',
+        dest='df_sketch',
+        help='Store a sketch of the document frequencies of the words, so that searches only read the filters of the documents with the first word'
+    )
+    parser.add_argument(
+        '--df-sketch-error',
+        type=_sketch_error_arg,
+        metavar='ErrorRate',
+        dest='df_sketch_error',
+        default=0.0002,
+        help='Error target of the document frequency sketch, it has e/ErrorRate counters per row Range:(0.0,1.0] Default:0.0002'
+    )
+
     args = vars(parser.parse_args()) # Convert to dictionary
     # args- Arguments which are needed to create the SB filter.
 
@@ -97,7 +289,23 @@ def sthir_arg_parser():
         output_file="search.html", 
         false_positive=args["error_rate"],
         chunk_size=args["chunk_size"], 
-        remove_stopwords=args["remove_stopwords"]
+        remove_stopwords=args["remove_stopwords"],
+        hashing=args["hashing"],
+        jobs=args["jobs"],
+        enable_lemmetization=args["enable_lemmetization"],
+        incremental=args["incremental"],
+        backend=args["backend"],
+        shard_size=args["shard_size"],
+        layout=args["layout"],
+        counter_format=args["counter_format"],
+        compress=args["compress"],
+        index_file=args["index_file"],
+        max_bytes=args["max_bytes"],
+        total_bytes=args["total_bytes"],
+        prefix_length=args["prefix_length"],
+        prefix_false_positive=args["prefix_false_positive"],
+        df_sketch=args["df_sketch"],
+        df_sketch_error=args["df_sketch_error"]
     )
 
 
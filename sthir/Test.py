@@ -3,13 +3,13 @@ from collections import Counter
 from logging import Formatter,FileHandler,getLogger
 from logging import DEBUG 
 
-from nltk.stem import WordNetLemmatizer 
+from sthir.accuracy import Config , evaluate , read_dict_words , run
 from sthir.parse import extract_html_bs4
-from sthir.spectral_bloom_filter import  Spectral_Bloom_Filter , Hash_Funcs
-from typing import Iterable
+from sthir.spectral_bloom_filter import  Spectral_Bloom_Filter
+from typing import Iterable, Tuple
+
+import numpy as np
 
-import pkgutil
-import io
 import csv
 
 from os.path import isfile , abspath , dirname ,join, isdir
@@ -19,17 +19,20 @@ from os import listdir
 def _create_logger():
     """
     Returns a well setup logger object for logging the statistics after testing the 
-    Bloom Filters.
+    Bloom Filters in bloomfilter.log.
     """
     logger = getLogger(name='SBF')
     logger.setLevel(DEBUG)
+    # Every Tester shares the logger, the file is only opened once
+    if logger.handlers:
+        return logger
 
     formatter = Formatter(
         '%(asctime)s: %(name)s :- %(levelname)s: \n%(message)s',
         datefmt='%m/%d/%Y %I:%M:%S %p'
     )
 
-    file_handler = FileHandler(r'bloomfilter.log')
+    file_handler = FileHandler(r'bloomfilter.log', delay=True)
     file_handler.setFormatter(formatter)
 
     logger.addHandler(file_handler)
@@ -92,13 +95,7 @@ class Tester:
         Reads english_dict.txt file from the resources and creates a list of words
         on which the SBF(s) will be tested.
         """
-        dataString = pkgutil.get_data( "sthir", "resources/english_dict.txt")
-        l = [ str(i)[2:-1] for i in dataString.splitlines()]
-        l = [ word.strip() for word in l]
-        if self.lemmetize: 
-            lemmatizer = WordNetLemmatizer() 
-            l = [ lemmatizer.lemmatize(word) for word in l ]
-        return l
+        return read_dict_words(self.lemmetize)
         
     def __generate_Filter(self, doc_path:str )->None:
         """
@@ -114,15 +111,26 @@ class Tester:
         self.tokens = extract_html_bs4(self.doc_path ,self.remove_stopwords , self.lemmetize )
 
         self.n = len(self.tokens)
-        self.m, self.k = self.spectral.optimal_m_k(self.n, self.fp_rate)
-        
+        self.counter =  self.spectral.create_filter( self.tokens, self.fp_rate, self.chunk_size,
+            to_bitarray=False
+        )
+        self.m, self.k = self.spectral.m, self.spectral.k
+
         self.logger.info( 
             "\tNo_of_words:{} Count_array_size:{} No_of_hashes:{} \n\terror_rate:{} ".format(self.n, self.m, self.k, self.fp_rate)
         )
 
-        self.counter =  self.spectral.create_filter( self.tokens, self.m, self.chunk_size, self.k,
-            method="minimum", to_bitarray=False
-        )
+    def __evaluate(self) -> Tuple[int, int, int, int]:
+        """
+        Queries the filter with all the testing_words at once (see sthir.accuracy.evaluate).
+
+        Returns the number of inserted words found in the dictionary, how many of
+        them got a wrong count, the number of unseen words and how many of them
+        were false positives.
+        """
+        word_counts = Counter(self.tokens)
+        counts = np.array([word_counts[word] for word in self.testing_words])
+        return evaluate(self.spectral.query_many(self.testing_words), counts, self.chunk_size)
 
     def test_filter_for_file(self, doc_path:str):
         """
@@ -134,35 +142,7 @@ class Tester:
 
         self.__generate_Filter(doc_path)
 
-        word_counts = Counter(self.tokens)
-
-        hash_funcs = Hash_Funcs(k=self.k, m= self.m)
-
-        fp_count , no_of_unseen_words = 0 , 0
-        wrong_count , seen_words = 0 , 0
-
-        #Loop that iterates through the testing_words
-        for word in self.testing_words:
-
-            #Querying the filter
-            hashed_indices = hash_funcs.get_hashes(word)
-            values = [ int(self.counter[i],2) for i in hashed_indices]
-            SBF_ans = min(values)               #Filter's prediction
-            current_count = word_counts[word] #Actual count in the document
-
-            if current_count == 0:                  # word is absent in the filter
-                no_of_unseen_words += 1
-                if SBF_ans != 0: fp_count += 1      #It is a false postive
-            else:                                   #word was inserted
-                seen_words += 1
-                if SBF_ans != current_count:
-                    if SBF_ans == self.max_word_count and current_count >= self.max_word_count:
-                        # The no of occurences of the word is greater than or equal to 
-                        # the max_word_count and the SBF prediction is exactly equal 
-                        # to the max_word_count. So SBF was correct!
-                        continue
-                    else:
-                        wrong_count += 1
+        seen_words , wrong_count , no_of_unseen_words , fp_count = self.__evaluate()
 
         # Headers for the csv file                
         headers = [
@@ -204,10 +184,13 @@ class Tester:
             "\tTotal Error: {}\n".format( (fp_count+wrong_count) / self.no_of_words )  
         )
 
-    def test_dir(self, dir_path:str)-> None :
+    def test_dir(self, dir_path:str, jobs:int = 1)-> None :
         """
-        Tests and creates *stats.csv* and *common_stats.txt* file providing stats after testing 
-        all the html files in directory against the test words in a large dictionary.
+        Tests all the html files in directory against the test words in a large dictionary,
+        with sthir.accuracy.run, and writes the stats of every file to
+        *<dir_path>_fp_<fp_rate>_size_<chunk_size>.csv* in the directory.
+        Files already in its checkpoint are not tested again, unless they were edited since.
+        For a grid of parameters, use ``python -m sthir.accuracy``.
         """
         if not isdir(dir_path):
             raise Exception(f"{dir_path} is not a valid directory.")
@@ -215,70 +198,10 @@ class Tester:
         abs_dir_path = abspath( dir_path )
         csv_file_name = f'{dir_path}_fp_{self.fp_rate}_size_{self.chunk_size}'
         csv_file = join(  abs_dir_path , f'{csv_file_name}.csv')
-        txt_file=  join(  abs_dir_path , f'{csv_file_name}_common_stats.csv')
-
-        commomn_stats = f'Chunk size:{self.chunk_size}\n' + f'Error rate:{self.fp_rate}'
 
-        with open(txt_file,'w',encoding='utf8') as txtfile:
-            txtfile.write(commomn_stats)
-
-        # Headers for the csv file                
-        headers = [
-            'Filename', 'No_of_tokens(n)' ,'No_of_hashes(k)' , 'Filter-size(m)' , 
-            'Inserted Words in dict' , 'Count_Mismatches' , 'Error in counts',
-            'New words', 'False Positives', 'FP_Error'
+        files = [
+            join(abs_dir_path, current_file) for current_file in sorted(listdir(abs_dir_path))
+            if current_file.endswith(".html")
         ]
-
-
-        for current_file in listdir(abs_dir_path):
-
-            if current_file.endswith(".html"):
-                current_file_path = join(  abs_dir_path , current_file )
-
-                self.__generate_Filter( current_file_path)
-                hash_funcs = Hash_Funcs(k=self.k, m= self.m)
-
-                word_counts = Counter(self.tokens)
-                fp_count , no_of_unseen_words = 0 , 0
-
-                wrong_count , seen_words = 0 , 0
-
-                #Loop that iterates through the testing_words
-                for word in self.testing_words:
-
-                    #Querying the filter
-                    hashed_indices = hash_funcs.get_hashes(word)
-                    values = [ int(self.counter[i],2) for i in hashed_indices]
-                    SBF_ans = min(values)               #Filter's prediction
-                    current_count = word_counts[word] #Actual count in the document
-
-                    if current_count == 0:                  # word is absent in the filter
-                        no_of_unseen_words += 1
-                        if SBF_ans != 0: fp_count += 1      #It is a false postive
-                    else:                                   #word was inserted
-                        seen_words += 1
-                        if SBF_ans != current_count:
-                            if SBF_ans == self.max_word_count and current_count >= self.max_word_count:
-                                # The no of occurences of the word is greater than or equal to 
-                                # the max_word_count and the  SBF prediction is exactly equal 
-                                # to the max_word_count. So SBF was correct!
-                                continue
-                            else:
-                                wrong_count += 1
-
-                #Entry for the csv file
-                entry = [
-                        current_file, self.n, self.k , self.m ,
-                        seen_words, wrong_count , round( wrong_count / seen_words,10),
-                        no_of_unseen_words , fp_count ,round(fp_count / no_of_unseen_words , 10)
-                    ]
-                
-                if isfile( csv_file ): 
-                    with open(csv_file, 'a') as f:   
-                        writer = csv.writer(f)
-                        writer.writerow(entry)
-                else:
-                    with open(csv_file, 'w',newline='') as f:
-                        writer = csv.writer(f)
-                        writer.writerow(headers)
-                        writer.writerow(entry)
+        run(files, [Config(self.fp_rate, self.chunk_size, "standard")], csv_file,
+            jobs=jobs, remove_stopwords=self.remove_stopwords, lemmetize=self.lemmetize)
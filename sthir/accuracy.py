@@ -0,0 +1,281 @@
+"""
+Accuracy benchmark of Spectral Bloom Filters over a grid of build parameters.
+
+Every HTML file of a corpus is tokenized once, then a filter is built for each
+(fp_rate, chunk_size, hashing) of the grid and queried with the whole
+resources/english_dict.txt word list. Files are evaluated in parallel.
+
+Each finished file is appended to a checkpoint (JSON lines, next to the results
+file), so an interrupted run resumes with the files and configurations it has
+not evaluated yet. Checkpoint rows also hold the content hash of their file and
+the tokenization flags, a file edited since, or evaluated with other flags, is
+evaluated again. The results file is one CSV with a row per (file, configuration)
+and the columns of RESULT_COLUMNS.
+
+Usage: python -m sthir.accuracy corpus/ --fp-rates 0.1 0.01 --chunk-sizes 4 8 -j 4 -o results.csv
+"""
+import argparse
+import csv
+import json
+import os
+import pkgutil
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+from math import ceil
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from sthir.parse import extract_html_bs4, lemmatize
+from sthir.scan import hash_file
+from sthir.spectral_bloom_filter import HASHING_SCHEMES, Spectral_Bloom_Filter
+
+Config = namedtuple("Config", ["fp_rate", "chunk_size", "hashing"])
+
+RESULT_COLUMNS = [
+    "file", "fp_rate", "chunk_size", "hashing", "tokens", "unique_tokens", "m", "k",
+    "bytes", "build_seconds", "query_seconds", "seen_words", "count_mismatches",
+    "count_error", "unseen_words", "false_positives", "observed_fp_rate"
+]
+
+
+def read_dict_words(lemmetize: bool = False) -> List[str]:
+    """
+    Reads english_dict.txt file from the resources, the words the filters are tested on.
+    """
+    dataString = pkgutil.get_data("sthir", "resources/english_dict.txt")
+    words = [str(i)[2:-1].strip() for i in dataString.splitlines()]
+    if lemmetize:
+        # Shares the memoized lemmatizer used while parsing the documents
+        words = list(lemmatize(words))
+    return words
+
+
+def grid(fp_rates: Iterable[float],
+         chunk_sizes: Iterable[int],
+         hashings: Iterable[str] = ("standard", )) -> List[Config]:
+    """
+    Returns every combination of the build parameters
+    """
+    return [Config(*config) for config in product(fp_rates, chunk_sizes, hashings)]
+
+
+def evaluate(estimates: np.ndarray, counts: np.ndarray, chunk_size: int) -> Tuple[int, int, int, int]:
+    """
+    Compares the frequencies estimated by a filter (see Spectral_Bloom_Filter.query_many)
+    with the true counts of the same words.
+
+    :returns: The number of inserted words, how many of them got a wrong count,
+              the number of unseen words and how many of them were false positives
+    """
+    max_word_count = 2**chunk_size - 1
+    estimates = estimates.astype(np.int64)
+
+    unseen = counts == 0
+    false_positives = int(np.count_nonzero(estimates[unseen] != 0))
+    # A word seen max_word_count times or more is counted right by a saturated counter
+    saturated = (estimates == max_word_count) & (counts >= max_word_count)
+    mismatches = int(np.count_nonzero(~unseen & (estimates != counts) & ~saturated))
+
+    no_unseen = int(np.count_nonzero(unseen))
+    return len(counts) - no_unseen, mismatches, no_unseen, false_positives
+
+
+def _ratio(numerator: int, denominator: int) -> float:
+    return numerator / denominator if denominator else float("nan")
+
+
+def evaluate_file(path: str,
+                  configs: Sequence[Config],
+                  words: Sequence[str],
+                  remove_stopwords: bool = True,
+                  lemmetize: bool = False) -> List[Dict]:
+    """
+    Tokenizes a file once and evaluates a filter for every configuration
+
+    :returns: One row (RESULT_COLUMNS) per configuration
+    """
+    tokens = extract_html_bs4(path, remove_stopwords, lemmetize)
+    word_counts = Counter(tokens)
+    counts = np.array([word_counts[word] for word in words])
+    rows = list()
+    for config in configs:
+        spectral = Spectral_Bloom_Filter()
+        start = time.perf_counter()
+        spectral.create_filter(tokens, config.fp_rate, config.chunk_size,
+                               to_bitarray=False, hashing=config.hashing)
+        built = time.perf_counter()
+        estimates = spectral.query_many(words)
+        queried = time.perf_counter()
+        seen, mismatches, unseen, false_positives = evaluate(estimates, counts, config.chunk_size)
+        rows.append({
+            "file": path,
+            "fp_rate": config.fp_rate,
+            "chunk_size": config.chunk_size,
+            "hashing": config.hashing,
+            "tokens": len(tokens),
+            "unique_tokens": len(word_counts),
+            "m": spectral.m,
+            "k": spectral.k,
+            "bytes": ceil(spectral.m * config.chunk_size / 8),
+            "build_seconds": built - start,
+            "query_seconds": queried - built,
+            "seen_words": seen,
+            "count_mismatches": mismatches,
+            "count_error": _ratio(mismatches, seen),
+            "unseen_words": unseen,
+            "false_positives": false_positives,
+            "observed_fp_rate": _ratio(false_positives, unseen),
+        })
+    return rows
+
+
+def get_checkpoint_path(results_file: str) -> str:
+    """
+    Returns the checkpoint file of a results file
+    """
+    return os.path.splitext(results_file)[0] + ".checkpoint.jsonl"
+
+
+def _key(row: Dict) -> Tuple:
+    # Rows of older checkpoints have no hash or flags and are never matched
+    return (row["file"], row.get("hash"), row.get("remove_stopwords"), row.get("lemmetize"),
+            row["fp_rate"], row["chunk_size"], row["hashing"])
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def load_checkpoint(checkpoint_file: str) -> Dict[Tuple, Dict]:
+    """
+    Returns the rows of a checkpoint by (file, hash, remove_stopwords, lemmetize,
+    fp_rate, chunk_size, hashing), a line cut short by an interrupted run is ignored
+    """
+    rows = dict()
+    if not os.path.isfile(checkpoint_file):
+        return rows
+    with open(checkpoint_file, encoding="utf8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            rows[_key(row)] = row
+    return rows
+
+
+def run(files: Sequence[str],
+        configs: Sequence[Config],
+        results_file: str,
+        jobs: int = 1,
+        remove_stopwords: bool = True,
+        lemmetize: bool = False) -> List[Dict]:
+    """
+    Evaluates every file for every configuration and writes the results file.
+
+    :param files: HTML files of the corpus
+    :param configs: Configurations to evaluate, see grid
+    :param results_file: Path of the CSV results file, the checkpoint is kept next to it
+    :param jobs: Number of worker processes
+    :returns: The rows of the results file, ordered by configuration then file
+    """
+    checkpoint_file = get_checkpoint_path(results_file)
+    done = load_checkpoint(checkpoint_file)
+    # What a checkpoint row depends on besides the configuration
+    settings = {
+        file: dict(file=file, hash=hash_file(file), remove_stopwords=remove_stopwords, lemmetize=lemmetize)
+        for file in files
+    }
+    pending = {
+        file: [config for config in configs if _key(dict(settings[file], **config._asdict())) not in done]
+        for file in files
+    }
+    pending = {file: todo for file, todo in pending.items() if todo}
+
+    if pending:
+        words = read_dict_words(lemmetize)
+        with open(checkpoint_file, "a", encoding="utf8") as checkpoint:
+            if checkpoint.tell() and not _ends_with_newline(checkpoint_file):
+                # Starts after the line an interrupted run left unfinished
+                checkpoint.write("\n")
+
+            def save(rows):
+                for row in rows:
+                    row.update(settings[row["file"]])
+                    done[_key(row)] = row
+                    checkpoint.write(json.dumps(row) + "\n")
+                checkpoint.flush()
+
+            if jobs > 1 and len(pending) > 1:
+                with ProcessPoolExecutor(max_workers=jobs) as pool:
+                    futures = [
+                        pool.submit(evaluate_file, file, todo, words, remove_stopwords, lemmetize)
+                        for file, todo in pending.items()
+                    ]
+                    for future in as_completed(futures):
+                        save(future.result())
+            else:
+                for file, todo in pending.items():
+                    save(evaluate_file(file, todo, words, remove_stopwords, lemmetize))
+
+    rows = [done[_key(dict(settings[file], **config._asdict()))] for config in configs for file in files]
+    with open(results_file, "w", newline="", encoding="utf8") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+
+def summarize(rows: Sequence[Dict]) -> List[Dict]:
+    """
+    Averages the rows of every configuration over the files
+    """
+    summary = dict()
+    for row in rows:
+        summary.setdefault((row["fp_rate"], row["chunk_size"], row["hashing"]), []).append(row)
+    return [{
+        "fp_rate": fp_rate,
+        "chunk_size": chunk_size,
+        "hashing": hashing,
+        "files": len(group),
+        "bytes": np.mean([row["bytes"] for row in group]),
+        "build_seconds": np.mean([row["build_seconds"] for row in group]),
+        "query_seconds": np.mean([row["query_seconds"] for row in group]),
+        "count_error": np.nanmean([row["count_error"] for row in group]),
+        "observed_fp_rate": np.nanmean([row["observed_fp_rate"] for row in group]),
+    } for (fp_rate, chunk_size, hashing), group in summary.items()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy of Spectral Bloom Filters over a grid of parameters")
+    parser.add_argument("path", help="Directory of HTML files")
+    parser.add_argument("--fp-rates", type=float, nargs="+", default=[0.1, 0.01])
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[4])
+    parser.add_argument("--hashing", nargs="+", choices=HASHING_SCHEMES, default=["standard"])
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("-o", "--output", default="accuracy.csv", help="Results file")
+    parser.add_argument("-ds", dest="remove_stopwords", action="store_false",
+                        help="Disable stopword removal from files")
+    parser.add_argument("-l", "--lemmetize", action="store_true")
+    args = parser.parse_args()
+
+    files = sorted(os.path.join(args.path, name) for name in os.listdir(args.path) if name.endswith(".html"))
+    rows = run(files, grid(args.fp_rates, args.chunk_sizes, args.hashing), args.output,
+               jobs=args.jobs, remove_stopwords=args.remove_stopwords, lemmetize=args.lemmetize)
+
+    print("{:>8}{:>6}{:>10}{:>10}{:>12}{:>12}{:>12}{:>10}".format(
+        "fp_rate", "size", "hashing", "bytes", "build ms", "query ms", "count err", "fp"))
+    for row in summarize(rows):
+        print("{:>8}{:>6}{:>10}{:>10.0f}{:>12.2f}{:>12.2f}{:>12.4f}{:>10.4f}".format(
+            row["fp_rate"], row["chunk_size"], row["hashing"], row["bytes"],
+            1000 * row["build_seconds"], 1000 * row["query_seconds"],
+            row["count_error"], row["observed_fp_rate"]))
+
+
+if __name__ == "__main__":
+    main()
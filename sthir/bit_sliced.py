@@ -0,0 +1,100 @@
+"""
+Bit-sliced layout of Spectral Bloom Filters, in the style of BitFunnel.
+
+Documents of similar vocabulary size are grouped under a shared m and k.
+Inside a group, bit b of counter j of every document is stored in the same
+row (row ``j * chunk_size + b``, most significant bit first), one bit per
+document. A query hashes each word once per group and reads k * chunk_size
+rows to get the counters of all documents of the group together.
+
+|  Paper: BitFunnel: Revisiting Signatures for Search, SIGIR '17
+|  DOI: https://doi.org/10.1145/3077136.3080789
+"""
+from math import ceil, log2
+from typing import Counter, List, Sequence, Tuple
+
+import numpy as np
+
+from sthir.generate_search import OFFSET
+from sthir.spectral_bloom_filter import Spectral_Bloom_Filter
+
+# Bit weights of one base2p15 character, most significant bit first
+_WEIGHTS = (1 << np.arange(14, -1, -1)).astype(np.uint32)
+
+
+def group_documents(unique_counts: Sequence[int], p: float) -> List[List[int]]:
+    """
+    Groups documents whose optimal m falls in the same power of two,
+    so that sharing the largest m of a group at most doubles a filter.
+
+    :param unique_counts: Number of unique tokens of every document
+    :param p: The false positive rate
+    :returns: Lists of document positions, groups ordered by size
+    """
+    spectral = Spectral_Bloom_Filter()
+    groups = dict()
+    for doc, n in enumerate(unique_counts):
+        m, _ = spectral.optimal_m_k(max(n, 1), p)
+        groups.setdefault(ceil(log2(m)), []).append(doc)
+    return [groups[bucket] for bucket in sorted(groups)]
+
+
+def bit_slice(counters: np.ndarray, chunk_size: int, block: int = 4096) -> str:
+    """
+    Encodes the counters of a group of documents as bit-sliced rows.
+
+    Row ``j * chunk_size + b`` holds bit b (most significant first) of counter j
+    of every document, padded to a multiple of 15 documents so that each row
+    is a whole number of base2p15 characters. The result is a base2p15 string
+    (padding digit "0"), row r starts at character ``1 + r * ceil(D / 15)``.
+
+    :param counters: Matrix of shape (D documents, m counters)
+    :param chunk_size: Bits per counter
+    :param block: Number of counters encoded at a time, bounds memory use
+    :returns: The base2p15 encoded rows
+    """
+    docs, m = counters.shape
+    row_chars = ceil(docs / 15)
+    padded = np.zeros((row_chars * 15, m), dtype=counters.dtype)
+    padded[:docs] = counters
+
+    encoded = ["0"]
+    for start in range(0, m, block):
+        chunk = padded[:, start:start + block].astype(np.uint32)
+        planes = [
+            # (15-doc groups, 15, counters) -> (counters, 15-doc groups)
+            np.tensordot(_WEIGHTS, ((chunk >> bit) & 1).reshape(row_chars, 15, -1), axes=(0, 1)).T
+            for bit in range(chunk_size - 1, -1, -1)
+        ]
+        characters = np.stack(planes, axis=1) + OFFSET
+        encoded.append(characters.astype("<u4").tobytes().decode("utf-32-le"))
+    return "".join(encoded)
+
+
+def build_groups(token_counts: Sequence[Counter],
+                 p: float,
+                 chunk_size: int = 4,
+                 hashing: str = "standard") -> List[Tuple[List[int], list]]:
+    """
+    Builds the bit-sliced groups of a collection of documents.
+
+    :param token_counts: Token frequencies of every document
+    :param p: The false positive rate
+    :param chunk_size: Size of each counter in bits
+    :param hashing: One of spectral_bloom_filter.HASHING_SCHEMES
+    :returns: For every group, the positions of its documents and its entry
+              [bit-sliced rows, chunk_size, m, k, hashing, [no_items of every document]]
+    """
+    spectral = Spectral_Bloom_Filter()
+    groups = list()
+    for docs in group_documents([len(tokens) for tokens in token_counts], p):
+        # The largest document of the group sizes it, k only depends on p
+        largest = max(docs, key=lambda doc: len(token_counts[doc]))
+        m, k = spectral.optimal_m_k(max(len(token_counts[largest]), 1), p)
+        counters = np.stack([
+            spectral.create_counters(token_counts[doc], m, k, chunk_size, hashing)
+            for doc in docs
+        ])
+        no_items = [sum(token_counts[doc].values()) for doc in docs]
+        groups.append((docs, [bit_slice(counters, chunk_size), chunk_size, m, k, hashing, no_items]))
+    return groups
@@ -13,16 +13,51 @@ HTML_TEMPLATE = {
             <input type='text' id='link_id'>
             <input type='button' id='link' value='Search' onClick='javascript:get_links()'>
             <span id="search"></span>
-            <script>
+            <script id="sthir_engine">
                 !function(a,b){"use strict";function c(a,b){return(65535&a)*b+(((a>>>16)*b&65535)<<16)}function d(a,b){return a<<b|a>>>32-b}function e(a){return a^=a>>>16,a=c(a,2246822507),a^=a>>>13,a=c(a,3266489909),a^=a>>>16}function f(a,b){a=[a[0]>>>16,65535&a[0],a[1]>>>16,65535&a[1]],b=[b[0]>>>16,65535&b[0],b[1]>>>16,65535&b[1]];var c=[0,0,0,0];return c[3]+=a[3]+b[3],c[2]+=c[3]>>>16,c[3]&=65535,c[2]+=a[2]+b[2],c[1]+=c[2]>>>16,c[2]&=65535,c[1]+=a[1]+b[1],c[0]+=c[1]>>>16,c[1]&=65535,c[0]+=a[0]+b[0],c[0]&=65535,[c[0]<<16|c[1],c[2]<<16|c[3]]}function g(a,b){a=[a[0]>>>16,65535&a[0],a[1]>>>16,65535&a[1]],b=[b[0]>>>16,65535&b[0],b[1]>>>16,65535&b[1]];var c=[0,0,0,0];return c[3]+=a[3]*b[3],c[2]+=c[3]>>>16,c[3]&=65535,c[2]+=a[2]*b[3],c[1]+=c[2]>>>16,c[2]&=65535,c[2]+=a[3]*b[2],c[1]+=c[2]>>>16,c[2]&=65535,c[1]+=a[1]*b[3],c[0]+=c[1]>>>16,c[1]&=65535,c[1]+=a[2]*b[2],c[0]+=c[1]>>>16,c[1]&=65535,c[1]+=a[3]*b[1],c[0]+=c[1]>>>16,c[1]&=65535,c[0]+=a[0]*b[3]+a[1]*b[2]+a[2]*b[1]+a[3]*b[0],c[0]&=65535,[c[0]<<16|c[1],c[2]<<16|c[3]]}function h(a,b){return b%=64,32===b?[a[1],a[0]]:32>b?[a[0]<<b|a[1]>>>32-b,a[1]<<b|a[0]>>>32-b]:(b-=32,[a[1]<<b|a[0]>>>32-b,a[0]<<b|a[1]>>>32-b])}function i(a,b){return b%=64,0===b?a:32>b?[a[0]<<b|a[1]>>>32-b,a[1]<<b]:[a[1]<<b-32,0]}function j(a,b){return[a[0]^b[0],a[1]^b[1]]}function k(a){return a=j(a,[0,a[0]>>>1]),a=g(a,[4283543511,3981806797]),a=j(a,[0,a[0]>>>1]),a=g(a,[3301882366,444984403]),a=j(a,[0,a[0]>>>1])}var l={version:"3.0.1",x86:{},x64:{}};l.x86.hash32=function(a,b){a=a||"",b=b||0;for(var f=a.length%4,g=a.length-f,h=b,i=0,j=3432918353,k=461845907,l=0;g>l;l+=4)i=255&a.charCodeAt(l)|(255&a.charCodeAt(l+1))<<8|(255&a.charCodeAt(l+2))<<16|(255&a.charCodeAt(l+3))<<24,i=c(i,j),i=d(i,15),i=c(i,k),h^=i,h=d(h,13),h=c(h,5)+3864292196;switch(i=0,f){case 3:i^=(255&a.charCodeAt(l+2))<<16;case 2:i^=(255&a.charCodeAt(l+1))<<8;case 1:i^=255&a.charCodeAt(l),i=c(i,j),i=d(i,15),i=c(i,k),h^=i}return h^=a.length,h=e(h),h>>>0},l.x86.hash128=function(a,b){a=a||"",b=b||0;for(var f=a.length%16,g=a.length-f,h=b,i=b,j=b,k=b,l=0,m=0,n=0,o=0,p=597399067,q=2869860233,r=951274213,s=2716044179,t=0;g>t;t+=16)l=255&a.charCodeAt(t)|(255&a.charCodeAt(t+1))<<8|(255&a.charCodeAt(t+2))<<16|(255&a.charCodeAt(t+3))<<24,m=255&a.charCodeAt(t+4)|(255&a.charCodeAt(t+5))<<8|(255&a.charCodeAt(t+6))<<16|(255&a.charCodeAt(t+7))<<24,n=255&a.charCodeAt(t+8)|(255&a.charCodeAt(t+9))<<8|(255&a.charCodeAt(t+10))<<16|(255&a.charCodeAt(t+11))<<24,o=255&a.charCodeAt(t+12)|(255&a.charCodeAt(t+13))<<8|(255&a.charCodeAt(t+14))<<16|(255&a.charCodeAt(t+15))<<24,l=c(l,p),l=d(l,15),l=c(l,q),h^=l,h=d(h,19),h+=i,h=c(h,5)+1444728091,m=c(m,q),m=d(m,16),m=c(m,r),i^=m,i=d(i,17),i+=j,i=c(i,5)+197830471,n=c(n,r),n=d(n,17),n=c(n,s),j^=n,j=d(j,15),j+=k,j=c(j,5)+2530024501,o=c(o,s),o=d(o,18),o=c(o,p),k^=o,k=d(k,13),k+=h,k=c(k,5)+850148119;switch(l=0,m=0,n=0,o=0,f){case 15:o^=a.charCodeAt(t+14)<<16;case 14:o^=a.charCodeAt(t+13)<<8;case 13:o^=a.charCodeAt(t+12),o=c(o,s),o=d(o,18),o=c(o,p),k^=o;case 12:n^=a.charCodeAt(t+11)<<24;case 11:n^=a.charCodeAt(t+10)<<16;case 10:n^=a.charCodeAt(t+9)<<8;case 9:n^=a.charCodeAt(t+8),n=c(n,r),n=d(n,17),n=c(n,s),j^=n;case 8:m^=a.charCodeAt(t+7)<<24;case 7:m^=a.charCodeAt(t+6)<<16;case 6:m^=a.charCodeAt(t+5)<<8;case 5:m^=a.charCodeAt(t+4),m=c(m,q),m=d(m,16),m=c(m,r),i^=m;case 4:l^=a.charCodeAt(t+3)<<24;case 3:l^=a.charCodeAt(t+2)<<16;case 2:l^=a.charCodeAt(t+1)<<8;case 1:l^=a.charCodeAt(t),l=c(l,p),l=d(l,15),l=c(l,q),h^=l}return h^=a.length,i^=a.length,j^=a.length,k^=a.length,h+=i,h+=j,h+=k,i+=h,j+=h,k+=h,h=e(h),i=e(i),j=e(j),k=e(k),h+=i,h+=j,h+=k,i+=h,j+=h,k+=h,("00000000"+(h>>>0).toString(16)).slice(-8)+("00000000"+(i>>>0).toString(16)).slice(-8)+("00000000"+(j>>>0).toString(16)).slice(-8)+("00000000"+(k>>>0).toString(16)).slice(-8)},l.x64.hash128=function(a,b){a=a||"",b=b||0;for(var c=a.length%16,d=a.length-c,e=[0,b],l=[0,b],m=[0,0],n=[0,0],o=[2277735313,289559509],p=[1291169091,658871167],q=0;d>q;q+=16)m=[255&a.charCodeAt(q+4)|(255&a.charCodeAt(q+5))<<8|(255&a.charCodeAt(q+6))<<16|(255&a.charCodeAt(q+7))<<24,255&a.charCodeAt(q)|(255&a.charCodeAt(q+1))<<8|(255&a.charCodeAt(q+2))<<16|(255&a.charCodeAt(q+3))<<24],n=[255&a.charCodeAt(q+12)|(255&a.charCodeAt(q+13))<<8|(255&a.charCodeAt(q+14))<<16|(255&a.charCodeAt(q+15))<<24,255&a.charCodeAt(q+8)|(255&a.charCodeAt(q+9))<<8|(255&a.charCodeAt(q+10))<<16|(255&a.charCodeAt(q+11))<<24],m=g(m,o),m=h(m,31),m=g(m,p),e=j(e,m),e=h(e,27),e=f(e,l),e=f(g(e,[0,5]),[0,1390208809]),n=g(n,p),n=h(n,33),n=g(n,o),l=j(l,n),l=h(l,31),l=f(l,e),l=f(g(l,[0,5]),[0,944331445]);switch(m=[0,0],n=[0,0],c){case 15:n=j(n,i([0,a.charCodeAt(q+14)],48));case 14:n=j(n,i([0,a.charCodeAt(q+13)],40));case 13:n=j(n,i([0,a.charCodeAt(q+12)],32));case 12:n=j(n,i([0,a.charCodeAt(q+11)],24));case 11:n=j(n,i([0,a.charCodeAt(q+10)],16));case 10:n=j(n,i([0,a.charCodeAt(q+9)],8));case 9:n=j(n,[0,a.charCodeAt(q+8)]),n=g(n,p),n=h(n,33),n=g(n,o),l=j(l,n);case 8:m=j(m,i([0,a.charCodeAt(q+7)],56));case 7:m=j(m,i([0,a.charCodeAt(q+6)],48));case 6:m=j(m,i([0,a.charCodeAt(q+5)],40));case 5:m=j(m,i([0,a.charCodeAt(q+4)],32));case 4:m=j(m,i([0,a.charCodeAt(q+3)],24));case 3:m=j(m,i([0,a.charCodeAt(q+2)],16));case 2:m=j(m,i([0,a.charCodeAt(q+1)],8));case 1:m=j(m,[0,a.charCodeAt(q)]),m=g(m,o),m=h(m,31),m=g(m,p),e=j(e,m)}return e=j(e,[0,a.length]),l=j(l,[0,a.length]),e=f(e,l),l=f(l,e),e=k(e),l=k(l),e=f(e,l),l=f(l,e),("00000000"+(e[0]>>>0).toString(16)).slice(-8)+("00000000"+(e[1]>>>0).toString(16)).slice(-8)+("00000000"+(l[0]>>>0).toString(16)).slice(-8)+("00000000"+(l[1]>>>0).toString(16)).slice(-8)},"undefined"!=typeof exports?("undefined"!=typeof module&&module.exports&&(exports=module.exports=l),exports.murmurHash3=l):"function"==typeof define&&define.amd?define([],function(){return l}):(l._murmurHash3=a.murmurHash3,l.noConflict=function(){return a.murmurHash3=l._murmurHash3,l._murmurHash3=b,l.noConflict=b,l},a.murmurHash3=l)}(this);
 
+                // Filters are base2p15 strings (15 bits per character after the padding digit),
+                // or Uint8Arrays when they were read from a compressed payload
+                function symbol_bits(data) {
+                    return typeof data === "string" ? 15 : 8;
+                }
+                function symbol_count(data) {
+                    return typeof data === "string" ? data.length - 1 : data.length;
+                }
+                function get_symbol(data, i) {
+                    return typeof data === "string" ? data.charCodeAt(1 + i) - 0xa1 : data[i];
+                }
+
                 class bitArray {
-                    constructor(base2p15, chunk_size, m, no_hashes, no_items) {
+                    constructor(base2p15, chunk_size, m, no_hashes, no_items, hashing, counter_format, prefix) {
                         this.bit_array = base2p15;
                         this.chunk_size = chunk_size;
                         this.m = m;
                         this.no_hashes = no_hashes;
                         this.no_items = no_items;
+                        // Filters built before hashing schemes existed used k seeded hashes
+                        this.hashing = hashing || "standard";
+                        // ["elias", block_size, offset_width, base2p15 block offsets] for gamma coded counters
+                        this.counter_format = counter_format || ["fixed"];
+                        if (this.counter_format[0] == "elias") {
+                            // Blocks are decoded on first use through the offset index
+                            this.block_size = this.counter_format[1];
+                            this.offset_width = this.counter_format[2];
+                            this.offsets = this.counter_format[3];
+                            this.counters = new Uint32Array(this.m);
+                            this.decoded = new Uint8Array(Math.ceil(this.m / this.block_size));
+                        }
+                        else {
+                            // Decoded once, lookups are then plain indexed reads
+                            this.counters = this.decode_counters();
+                        }
+                        // ["prefix", base2p15, m, k, min_length, max_length]: counts of the prefixes of the words
+                        this.prefix = null;
+                        if (prefix) {
+                            this.prefix = new bitArray(prefix[1], chunk_size, prefix[2], prefix[3], no_items, hashing);
+                            this.prefix_min_length = prefix[4];
+                            this.prefix_max_length = prefix[5];
+                        }
 
                         // console.log(this.base2p15_get_range(this.bit_array, 45, 50));
                     }
@@ -31,6 +66,82 @@ HTML_TEMPLATE = {
                             throw message || "Assertion failed";
                         }
                     }
+                    max_count() {
+                        // Largest counter of the filter (and of the prefix filter), no word counts more.
+                        // Gamma coded counters are not all decoded, they are bounded by 2**chunk_size - 1.
+                        if (this.largest_count === undefined) {
+                            let largest = 2**this.chunk_size - 1;
+                            if (this.counter_format[0] != "elias") {
+                                let counters = this.counters;
+                                largest = 0;
+                                for (var i = 0; i < counters.length; i++) {
+                                    if (counters[i] > largest) {
+                                        largest = counters[i];
+                                    }
+                                }
+                            }
+                            this.largest_count = largest;
+                            if (this.prefix) {
+                                this.largest_count = Math.max(this.largest_count, this.prefix.max_count());
+                            }
+                        }
+                        return this.largest_count;
+                    }
+                    decode_counters() {
+                        // Streams the 15 bit characters (or bytes) through an accumulator, chunk_size bits per counter
+                        let counters = this.chunk_size <= 8 ? new Uint8Array(this.m) : new Uint16Array(this.m);
+                        let mask = (1 << this.chunk_size) - 1;
+                        let width = symbol_bits(this.bit_array);
+                        let symbols = symbol_count(this.bit_array);
+                        let acc = 0;
+                        let bits = 0;
+                        let n = 0;
+                        for (var i = 0; i < symbols && n < this.m; i++) {
+                            acc = (acc << width) | get_symbol(this.bit_array, i);
+                            bits += width;
+                            while (bits >= this.chunk_size && n < this.m) {
+                                bits -= this.chunk_size;
+                                counters[n++] = (acc >>> bits) & mask;
+                            }
+                            // Less than chunk_size + 15 <= 31 bits are ever kept
+                            acc &= (1 << bits) - 1;
+                        }
+                        return counters;
+                    }
+                    read_bits(data, position, width) {
+                        // Reads width bits starting at bit position, most significant bit first
+                        let size = symbol_bits(data);
+                        let value = 0;
+                        for (var i = position; i < position + width; i++) {
+                            let symbol = get_symbol(data, Math.floor(i / size));
+                            value = value * 2 + ((symbol >> (size - 1 - i % size)) & 1);
+                        }
+                        return value;
+                    }
+                    decode_block(block) {
+                        // Elias gamma: N zero bits, then the N + 1 bits of counter + 1
+                        let position = this.read_bits(this.offsets, block * this.offset_width, this.offset_width);
+                        let end = Math.min(this.m, (block + 1) * this.block_size);
+                        for (var j = block * this.block_size; j < end; j++) {
+                            let zeros = 0;
+                            while (this.read_bits(this.bit_array, position, 1) == 0) {
+                                zeros++;
+                                position++;
+                            }
+                            this.counters[j] = this.read_bits(this.bit_array, position, zeros + 1) - 1;
+                            position += zeros + 1;
+                        }
+                        this.decoded[block] = 1;
+                    }
+                    get_counter(index) {
+                        if (this.decoded !== undefined) {
+                            let block = Math.floor(index / this.block_size);
+                            if (!this.decoded[block]) {
+                                this.decode_block(block);
+                            }
+                        }
+                        return this.counters[index];
+                    }
                     base2p15_decode(base2p15) {
                         let bit_string = "";
                         let offset = 0xa1;
@@ -63,6 +174,15 @@ HTML_TEMPLATE = {
                     }
                     get_hashes(word) {
                         let hash_indices = []
+                        if (this.hashing == "double") {
+                            // Kirsch-Mitzenmacher: (h1 + i*h2) % m, exact in doubles for k < 2**20
+                            let h1 = murmurHash3.x86.hash32(word, 0);
+                            let h2 = murmurHash3.x86.hash32(word, 1);
+                            for (var i = 0; i < this.no_hashes; i++){
+                                hash_indices.push( (h1 + i*h2) % this.m );
+                            }
+                            return hash_indices;
+                        }
                         for (var i = 0; i < this.no_hashes; i++){
                             // console.log(murmurHash3.x86.hash32(word, i));
                             hash_indices.push( murmurHash3.x86.hash32(word, i) % this.m );
@@ -83,7 +203,7 @@ HTML_TEMPLATE = {
                         let hash_indices = this.get_hashes(word);
                         let vals = []
                         for (var i = 0; i < hash_indices.length; i++) {
-                            vals.push(this.bin_to_integer(this.base2p15_get_chunk(hash_indices[i])));
+                            vals.push(this.get_counter(hash_indices[i]));
                         }
                         if (get_min == false) {
                             return vals;
@@ -109,67 +229,693 @@ HTML_TEMPLATE = {
                     }
                 }
 
-                function get_document_object(documents) {
+                class bitSlicedGroup {
+                    // Documents sharing m and k, bit b of counter j of every document is in row j*chunk_size + b
+                    constructor(base2p15, chunk_size, m, no_hashes, hashing, no_items) {
+                        this.bit_array = base2p15;
+                        this.chunk_size = chunk_size;
+                        this.m = m;
+                        this.no_hashes = no_hashes;
+                        this.hashing = hashing || "standard";
+                        this.no_items = no_items;
+                        this.length = no_items.length;
+                        this.row_chars = Math.ceil(this.length / 15);
+                        // 15 document bits per entry, decoded once
+                        this.rows = new Uint16Array(base2p15.length - 1);
+                        for (var i = 1; i < base2p15.length; i++) {
+                            this.rows[i - 1] = base2p15.charCodeAt(i) - 0xa1;
+                        }
+                    }
+                    get_hashes(word) {
+                        return bitArray.prototype.get_hashes.call(this, word);
+                    }
+                    get_row(row, counts, weight) {
+                        // ORs weight into counts[d] for every document d whose bit is set in the row
+                        let start = row*this.row_chars;
+                        for (var c = 0; c < this.row_chars; c++) {
+                            let bits = this.rows[start + c];
+                            for (var t = 0; bits != 0; t++, bits = (bits << 1) & 0x7fff) {
+                                if (bits & 0x4000) {
+                                    counts[c*15 + t] |= weight;
+                                }
+                            }
+                        }
+                    }
+                    get_counts(word) {
+                        // Minimum over the k counters of the word, for all documents at once
+                        let hash_indices = this.get_hashes(word);
+                        let mins = null;
+                        for (var i = 0; i < hash_indices.length; i++) {
+                            let counts = new Array(this.row_chars*15).fill(0);
+                            for (var b = 0; b < this.chunk_size; b++) {
+                                this.get_row(hash_indices[i]*this.chunk_size + b, counts, 1 << (this.chunk_size - b - 1));
+                            }
+                            mins = mins ? mins.map((x, d) => Math.min(x, counts[d])) : counts;
+                        }
+                        return mins.slice(0, this.length);
+                    }
+                    get_document_scores(words) {
+                        // Same running sums as bitArray.get_document_score(words, false) for every document
+                        let scores = [];
+                        let running = new Array(this.length).fill(0);
+                        for (var d = 0; d < this.length; d++) {
+                            scores.push([]);
+                        }
+                        for (var i = 0; i < words.length; i++) {
+                            let counts = this.get_counts(words[i]);
+                            for (var d = 0; d < this.length; d++) {
+                                running[d] += counts[d]/this.no_items[d];
+                                scores[d].push(running[d]);
+                            }
+                        }
+                        return scores;
+                    }
+                }
+
+                function get_group_objects(groups, documents) {
+                    for (var group=0; group<groups.length; group++) {
+                        bit_arrs.push(new bitSlicedGroup(groups[group][0], groups[group][1], groups[group][2], groups[group][3], groups[group][4], groups[group][5]));
+                    }
                     for (var document=0; document<documents.length; document++) {
-                        bit_arrs.push(new bitArray(documents[document][0], documents[document][1], documents[document][2], documents[document][3], documents[document][6]));
-                        urls.push(documents[document][4].replace(".bin", ".html"));
-                        titles.push(documents[document][5]);
+                        urls.push(documents[document][0]);
+                        titles.push(documents[document][1]);
                     }
                     return bit_arrs;
                 }
 
-                function get_all_scores(doc_objs, words) {
+                class dfSketch {
+                    // Count-min sketch of the document frequencies of the words (see sthir.df_sketch) -
+                    // [base2p15 counters, width, depth, bits, documents, prefix min_length, prefix max_length]
+                    constructor(sketch) {
+                        this.width = sketch[1];
+                        this.depth = sketch[2];
+                        this.no_documents = sketch[4];
+                        this.prefix_min_length = sketch[5];
+                        this.prefix_max_length = sketch[6];
+                        this.counters = new bitArray(sketch[0], sketch[3], this.width*this.depth, this.depth, 0).counters;
+                    }
+
+                    get_key(word) {
+                        // Prefixes are counted as in get_word_scores, shorter ones as words
+                        if (!word.endsWith("*")) {
+                            return word;
+                        }
+                        word = word.slice(0, -1);
+                        if (this.prefix_max_length > 0 && word.length >= this.prefix_min_length) {
+                            return word.slice(0, this.prefix_max_length) + "*";
+                        }
+                        return word;
+                    }
+
+                    get_count(word) {
+                        // Smallest counter of the word over the rows, never below its document frequency
+                        let key = this.get_key(word);
+                        let count = Infinity;
+                        for (var row = 0; row < this.depth; row++) {
+                            count = Math.min(count, this.counters[row*this.width + murmurHash3.x86.hash32(key, row) % this.width]);
+                        }
+                        return count;
+                    }
+
+                    get_frequencies(words) {
+                        // Documents with any of the words up to each one (see rank_scores),
+                        // estimated as those with the most frequent of them
+                        let frequencies = [], most = 0;
+                        for (const word of words) {
+                            most = Math.max(most, this.get_count(word));
+                            frequencies.push(Math.min(most, this.no_documents));
+                        }
+                        return frequencies;
+                    }
+                }
+
+                function get_document_object(documents, target) {
+                    target = target || {bit_arrs: bit_arrs, urls: urls, titles: titles};
+                    for (var document=0; document<documents.length; document++) {
+                        target.bit_arrs.push(new bitArray(documents[document][0], documents[document][1], documents[document][2], documents[document][3], documents[document][6], documents[document][7], documents[document][8], documents[document][9]));
+                        target.urls.push(documents[document][4].replace(".bin", ".html"));
+                        target.titles.push(documents[document][5]);
+                    }
+                    return target.bit_arrs;
+                }
+
+                // Filters, titles and urls of the documents, in page order
+                let bit_arrs = [];
+                let urls = [];
+                let titles = [];
+
+                // Sharded index: filters live in the JSON files (or gzip blobs, see read_compressed)
+                // listed in `shard_manifest`, each shard is fetched once, in parallel, and kept in memory.
+                let shard_manifest = null;
+                let shards = [];
+                let shard_requests = {};
+                // Newest query received, and newest scoring run (a query is scored again as shards arrive)
+                let latest_query = 0;
+                let latest_run = 0;
+                // Milliseconds of scoring between two checks for a newer query
+                const SLICE_MS = 8;
+                // Term frequencies of the most recently searched words (see get_word_scores),
+                // reset whenever the documents change
+                const WORD_CACHE_SIZE = 64;
+                let word_cache = new Map();
+                // dfSketch of the document frequencies, if the page has one
+                let document_frequencies = null;
+
+                function merge_shards() {
+                    // Documents keep the shard order, whatever order the shards arrived in
+                    word_cache = new Map();
+                    bit_arrs.length = 0;
+                    urls.length = 0;
+                    titles.length = 0;
+                    for (var i = 0; i < shards.length; i++) {
+                        if (shards[i]) {
+                            bit_arrs.push(...shards[i].bit_arrs);
+                            urls.push(...shards[i].urls);
+                            titles.push(...shards[i].titles);
+                        }
+                    }
+                }
+
+                function read_compressed(stream) {
+                    // gzip of: header length (4 bytes, big-endian), the JSON documents array
+                    // with the byte length of every filter in place of its base2p15 string,
+                    // then the filters' bytes. Decompressed as the chunks arrive.
+                    return new Response(stream.pipeThrough(new DecompressionStream("gzip")))
+                        .arrayBuffer()
+                        .then(buffer => {
+                            let bytes = new Uint8Array(buffer);
+                            let header = new DataView(buffer).getUint32(0);
+                            let documents = JSON.parse(new TextDecoder().decode(bytes.subarray(4, 4 + header)));
+                            let offset = 4 + header;
+                            for (var d = 0; d < documents.length; d++) {
+                                let length = documents[d][0];
+                                documents[d][0] = bytes.subarray(offset, offset + length);
+                                offset += length;
+                            }
+                            return documents;
+                        });
+                }
+
+                function load_shard(i) {
+                    if (!(i in shard_requests)) {
+                        let file = shard_manifest.shards[i].file;
+                        shard_requests[i] = fetch(file)
+                            .then(response => {
+                                if (!response.ok) {
+                                    throw new Error("Cannot fetch shard " + file + ": HTTP " + response.status);
+                                }
+                                return shard_manifest.compression == "gzip" ? read_compressed(response.body) : response.json();
+                            })
+                            .then(documents => {
+                                let shard = {bit_arrs: [], urls: [], titles: []};
+                                get_document_object(documents, shard);
+                                shards[i] = shard;
+                                merge_shards();
+                            })
+                            .catch(error => {
+                                // Fetched again by the next query
+                                delete shard_requests[i];
+                                throw error;
+                            });
+                    }
+                    return shard_requests[i];
+                }
+
+                function prefetch_shards() {
+                    for (var i = 0; i < shard_manifest.shards.length; i++) {
+                        load_shard(i).catch(error => console.error(error));
+                    }
+                }
+
+                function get_tf_scores(doc_objs, words) {
+                    // One entry per document, a bit-sliced group scores all of its documents at once
                     let tf_scores = [];
-                    let scores = [];
+                    for (var i = 0; i < doc_objs.length; i++) {
+                        if (doc_objs[i] instanceof bitSlicedGroup) {
+                            tf_scores.push(...doc_objs[i].get_document_scores(words));
+                        }
+                        else {
+                            tf_scores.push(doc_objs[i].get_document_score(words, false));
+                        }
+                    }
+                    return tf_scores;
+                }
+
+                class topScores {
+                    // The size best [score, document] pushed, in a min-heap of the worst of them.
+                    // Equal scores rank the earlier document first, as a stable sort.
+                    constructor(size) {
+                        this.size = size;
+                        this.heap = [];
+                    }
+
+                    worse(a, b) {
+                        return a[0] < b[0] || (a[0] == b[0] && a[1] > b[1]);
+                    }
+
+                    full() {
+                        return this.heap.length >= this.size;
+                    }
+
+                    threshold() {
+                        // Score to reach to enter a full heap
+                        return this.heap[0][0];
+                    }
+
+                    push(score, doc) {
+                        let heap = this.heap, item = [score, doc];
+                        if (this.size <= 0) {
+                            return;
+                        }
+                        if (heap.length < this.size) {
+                            heap.push(item);
+                            // Sift up
+                            let i = heap.length - 1;
+                            while (i > 0) {
+                                let parent = (i - 1) >> 1;
+                                if (!this.worse(heap[i], heap[parent])) {
+                                    break;
+                                }
+                                [heap[i], heap[parent]] = [heap[parent], heap[i]];
+                                i = parent;
+                            }
+                            return;
+                        }
+                        if (!this.worse(heap[0], item)) {
+                            return;
+                        }
+                        // Replace the worst and sift down
+                        heap[0] = item;
+                        let i = 0;
+                        while (true) {
+                            let left = 2*i + 1, right = left + 1, worst = i;
+                            if (left < heap.length && this.worse(heap[left], heap[worst])) {
+                                worst = left;
+                            }
+                            if (right < heap.length && this.worse(heap[right], heap[worst])) {
+                                worst = right;
+                            }
+                            if (worst == i) {
+                                break;
+                            }
+                            [heap[i], heap[worst]] = [heap[worst], heap[i]];
+                            i = worst;
+                        }
+                    }
+
+                    sorted() {
+                        // Best first
+                        return this.heap.slice().sort((a, b) => this.worse(a, b) ? 1 : -1);
+                    }
+                }
+
+                function rank_scores(tf_scores, words, titles, urls, limit) {
+                    // TF-IDF of every document, [score, title, url] of the limit best above 0 (all by default), best first
                     let doc_words = new Array(words.length).fill(0);
                     
-                    for (var i = 0; i < doc_objs.length; i++) {
-                        let score = doc_objs[i].get_document_score(words, false);
-                        tf_scores.push(score);
+                    for (var i = 0; i < tf_scores.length; i++) {
+                        let score = tf_scores[i];
                         for (var word_i = 0; word_i < words.length; word_i++) {
                             if (score[word_i] > 0) {
                                 doc_words[word_i] += 1;
                             }
                         }
                     }
+                    let idf = doc_words.map(count => Math.log10(tf_scores.length/count));
 
-                    for (var i = 0; i < doc_objs.length; i++) {
+                    let best = new topScores(limit === undefined ? tf_scores.length : limit);
+                    for (var i = 0; i < tf_scores.length; i++) {
                         let f_score = 1;
                         for (var word_i = 0; word_i < words.length; word_i++) {
-                            f_score *= tf_scores[i][word_i]*Math.log10(doc_objs.length/doc_words[word_i]);
-                            console.log(tf_scores[i], doc_words);
+                            f_score *= tf_scores[i][word_i]*idf[word_i];
                         }
                         if (f_score > 0) {
-                            scores.push([f_score, titles[i], urls[i]]);
+                            best.push(f_score, i);
+                        }
+                    }
+                    return best.sorted().map(([score, i]) => [score, titles[i], urls[i]]);
+                }
+
+                function get_all_scores(doc_objs, words) {
+                    return rank_scores(get_tf_scores(doc_objs, words), words, titles, urls);
+                }
+
+                function get_word_scores(doc_obj, word) {
+                    // Term frequency of one word, an entry per document (all the documents of a bit-sliced group).
+                    // A word ending in "*" counts the words starting with it in the prefix filter,
+                    // documents without one count the word itself.
+                    let prefix = word.endsWith("*");
+                    if (prefix) {
+                        word = word.slice(0, -1);
+                    }
+                    if (prefix && doc_obj.prefix && word.length >= doc_obj.prefix_min_length) {
+                        return [doc_obj.prefix.get_all_chunks(word.slice(0, doc_obj.prefix_max_length), true)/doc_obj.no_items];
+                    }
+                    if (doc_obj instanceof bitSlicedGroup) {
+                        let counts = doc_obj.get_counts(word);
+                        return counts.map((count, d) => count/doc_obj.no_items[d]);
+                    }
+                    return [doc_obj.get_all_chunks(word, true)/doc_obj.no_items];
+                }
+
+                function cached_word_scores(cache, word) {
+                    // A Map iterates in insertion order, the least recently used word comes first
+                    let scores = cache.get(word);
+                    if (scores !== undefined) {
+                        cache.delete(word);
+                        cache.set(word, scores);
+                    }
+                    return scores;
+                }
+
+                function cache_word_scores(cache, word, scores) {
+                    cache.set(word, scores);
+                    if (cache.size > WORD_CACHE_SIZE) {
+                        cache.delete(cache.keys().next().value);
+                    }
+                }
+
+                function yield_to_messages() {
+                    // Lets a newer query be received before scoring goes on
+                    return new Promise(resolve => setTimeout(resolve, 0));
+                }
+
+                function document_owners(doc_objs) {
+                    // [object, first document of the object, largest term frequency of a word] of every document
+                    let owners = [];
+                    for (var i = 0; i < doc_objs.length; i++) {
+                        let doc_obj = doc_objs[i];
+                        if (doc_obj instanceof bitSlicedGroup) {
+                            // Counters never exceed 2**chunk_size - 1
+                            for (var d = 0; d < doc_obj.length; d++) {
+                                owners.push([i, owners.length - d, (2**doc_obj.chunk_size - 1)/doc_obj.no_items[d]]);
+                            }
+                        }
+                        else {
+                            owners.push([i, owners.length, doc_obj.max_count()/doc_obj.no_items]);
                         }
                     }
-                    return scores.sort((a, b) => b[0]-a[0]);
+                    return owners;
+                }
+
+                async function score_query(id, words, offset, limit, reply) {
+                    // Ranks the documents loaded so far and replies with the results offset to offset + limit,
+                    // working in slices of SLICE_MS and stopping without replying once a newer run has started.
+                    // The term frequencies of the query are the running sums of the words' scores, as
+                    // bitArray.get_document_score, and only those needed are looked up (then cached, NaN until then):
+                    // a document counts for the document frequency of a word once it has any word up to it
+                    // (unless the frequencies come from the sketch of the page, see dfSketch),
+                    // only the documents with the first word can score above 0, and a document is dropped
+                    // once its upper bound cannot beat the best offset + limit scores.
+                    let run = ++latest_run;
+                    let doc_objs = bit_arrs.slice(), doc_titles = titles.slice(), doc_urls = urls.slice();
+                    let no_docs = doc_titles.length;
+                    let owners = document_owners(doc_objs);
+                    // Scores computed for documents which have changed since are not kept
+                    let cache = word_cache;
+                    let word_scores = words.map(word => {
+                        let scores = cached_word_scores(cache, word);
+                        if (scores === undefined) {
+                            scores = new Float64Array(no_docs).fill(NaN);
+                            cache_word_scores(cache, word, scores);
+                        }
+                        return scores;
+                    });
+                    let word_score = (word_i, d) => {
+                        let scores = word_scores[word_i];
+                        if (isNaN(scores[d])) {
+                            // Documents without words score 0
+                            let [i, first] = owners[d];
+                            scores.set(get_word_scores(doc_objs[i], words[word_i]).map(score => score || 0), first);
+                        }
+                        return scores[d];
+                    };
+                    let deadline = Date.now() + SLICE_MS;
+                    let next_slice = async () => {
+                        await yield_to_messages();
+                        deadline = Date.now() + SLICE_MS;
+                        return run == latest_run;
+                    };
+
+                    let doc_words, total_docs, candidates = [];
+                    if (document_frequencies !== null) {
+                        // The documents of the whole site are counted in the sketch,
+                        // only the filters of those with the first word are read further
+                        doc_words = document_frequencies.get_frequencies(words);
+                        total_docs = document_frequencies.no_documents;
+                        for (var d = 0; d < no_docs && doc_words[0] > 0; d++) {
+                            if (word_score(0, d) > 0) {
+                                candidates.push(d);
+                            }
+                            if (Date.now() > deadline && !await next_slice()) {
+                                return;
+                            }
+                        }
+                    }
+                    else {
+                        doc_words = new Array(words.length).fill(0);
+                        total_docs = no_docs;
+                        for (var d = 0; d < no_docs; d++) {
+                            let first = 0;
+                            while (first < words.length && word_score(first, d) == 0) {
+                                first++;
+                            }
+                            for (var word_i = first; word_i < words.length; word_i++) {
+                                doc_words[word_i] += 1;
+                            }
+                            if (first == 0) {
+                                candidates.push(d);
+                            }
+                            if (Date.now() > deadline && !await next_slice()) {
+                                return;
+                            }
+                        }
+                    }
+                    let idf = doc_words.map(count => Math.log10(total_docs/count));
+
+                    let best = new topScores(offset + limit);
+                    // Product of the words from word_i on, if every one adds max_tf to the running sum
+                    let upper_bound = (f_score, score, word_i, max_tf) => {
+                        for (; word_i < words.length; word_i++) {
+                            score += max_tf;
+                            f_score *= score*idf[word_i];
+                        }
+                        // Rounding must not drop a document tied with the threshold
+                        return f_score*(1 + 1e-9);
+                    };
+                    // Candidates with the highest bound first, once a bound cannot beat the best scores no other can
+                    let bounds = new Float64Array(no_docs);
+                    for (const d of candidates) {
+                        let score = word_score(0, d);
+                        bounds[d] = upper_bound(score*idf[0], score, 1, owners[d][2]);
+                    }
+                    candidates.sort((a, b) => bounds[b] - bounds[a] || a - b);
+                    for (const d of candidates) {
+                        if (best.full() && bounds[d] < best.threshold()) {
+                            break;
+                        }
+                        let score = 0, f_score = 1, word_i = 0;
+                        for (; word_i < words.length; word_i++) {
+                            if (word_i > 0 && best.full() && upper_bound(f_score, score, word_i, owners[d][2]) < best.threshold()) {
+                                break;
+                            }
+                            score += word_score(word_i, d);
+                            f_score *= score*idf[word_i];
+                        }
+                        if (word_i == words.length && f_score > 0) {
+                            best.push(f_score, d);
+                        }
+                        if (Date.now() > deadline && !await next_slice()) {
+                            return;
+                        }
+                    }
+                    // Every candidate scores above 0 unless a word is in every document (an idf of 0)
+                    let total = idf.every(value => value > 0) ? candidates.length : 0;
+                    let scores = best.sorted().slice(offset).map(([f_score, d]) => [f_score, doc_titles[d], doc_urls[d]]);
+                    reply({id: id, scores: scores, offset: offset, total: total});
+                }
+
+                function run_query(id, words, offset, limit, reply) {
+                    if (shard_manifest === null) {
+                        score_query(id, words, offset, limit, reply);
+                        return;
+                    }
+                    // Every shard holds documents of every query, the query is scored once with the shards
+                    // loaded and again as each missing one arrives (a failed shard is retried by the next query)
+                    let missing = 0;
+                    for (var i = 0; i < shard_manifest.shards.length; i++) {
+                        if (shards[i]) {
+                            continue;
+                        }
+                        missing++;
+                        load_shard(i).then(() => {
+                            if (id == latest_query) {
+                                score_query(id, words, offset, limit, reply);
+                            }
+                        }, error => console.error(error));
+                    }
+                    if (missing < shard_manifest.shards.length) {
+                        score_query(id, words, offset, limit, reply);
+                    }
+                }
+
+                function handle_message(message, reply) {
+                    // Messages from the page: the filters ("documents", "groups" or "manifest"), "df_sketch",
+                    // "prefetch" of the shards and "query" of the results offset to offset + limit,
+                    // answered with reply({id, scores, offset, total}) where total counts all the results
+                    if (message.type == "documents") {
+                        word_cache = new Map();
+                        get_document_object(message.documents);
+                    }
+                    else if (message.type == "groups") {
+                        word_cache = new Map();
+                        get_group_objects(message.groups, message.documents);
+                    }
+                    else if (message.type == "df_sketch") {
+                        document_frequencies = new dfSketch(message.sketch);
+                    }
+                    else if (message.type == "manifest") {
+                        shard_manifest = message.manifest;
+                    }
+                    else if (message.type == "prefetch") {
+                        prefetch_shards();
+                    }
+                    else if (message.type == "query") {
+                        latest_query = message.id;
+                        run_query(message.id, message.words, message.offset || 0, message.limit || Infinity, reply);
+                    }
+                }
+
+                if (typeof document === "undefined") {
+                    // Running in the worker started by start_engine
+                    onmessage = event => handle_message(event.data, result => postMessage(result));
+                }
+            </script>
+            <script>
+                // Searches run in a Web Worker made from the engine script above,
+                // or in this page where workers are not available
+                let latest_search = 0;
+                // Milliseconds without typing before searching
+                const TYPING_DELAY_MS = 150;
+                let typing_timer = null;
+                // Results shown at once, the engine only ranks the best up to the page shown
+                const PAGE_SIZE = 20;
+                let search_words = [];
+                // Sketch of the document frequencies (see dfSketch), set before the engine starts
+                let df_sketch = null;
+
+                function start_engine() {
+                    let source = document.getElementById("sthir_engine").textContent;
+                    let post;
+                    try {
+                        let worker = new Worker(URL.createObjectURL(new Blob([source], {type: "text/javascript"})));
+                        worker.onmessage = event => show_results(event.data);
+                        post = message => worker.postMessage(message);
+                    }
+                    catch (error) {
+                        post = message => handle_message(message, show_results);
+                    }
+                    if (df_sketch !== null) {
+                        post({type: "df_sketch", sketch: df_sketch});
+                    }
+                    return post;
+                }
+
+                function absolute_manifest(manifest) {
+                    // A worker made from a Blob resolves relative URLs against blob:
+                    if (!document.baseURI) {
+                        return manifest;
+                    }
+                    let shards = manifest.shards.map(shard => Object.assign({}, shard, {file: new URL(shard.file, document.baseURI).href}));
+                    return Object.assign({}, manifest, {shards: shards});
                 }
 
                 function get_links() {
-                    let vals = document.getElementById('link_id').value.toLowerCase().split(" ");
-                    let scores = get_all_scores(bit_arrs, vals);
+                    // Repeated, leading and trailing spaces do not make empty words
+                    search_words = document.getElementById('link_id').value.toLowerCase().split(" ").filter(word => word.length > 0);
+                    show_page(0);
+                }
+
+                function show_page(page) {
+                    let id = ++latest_search;
+                    if (search_words.length == 0) {
+                        show_links([], 0, 0);
+                        return;
+                    }
+                    post_engine({type: "query", id: id, words: search_words, offset: page*PAGE_SIZE, limit: PAGE_SIZE});
+                }
+
+                function search_as_you_type() {
+                    clearTimeout(typing_timer);
+                    typing_timer = setTimeout(get_links, TYPING_DELAY_MS);
+                }
+
+                document.getElementById('link_id').addEventListener('input', search_as_you_type);
+
+                function show_results(result) {
+                    // Results of superseded queries are dropped
+                    if (result.id == latest_search) {
+                        show_links(result.scores, result.offset, result.total);
+                    }
+                }
+
+                function show_links(scores, offset, total) {
+                    let links = [];
                     for(var i = 0; i < scores.length; i++) {
-                        let temp = "<a href=" + String(scores[i][2]) + ">" + scores[i][1] + "</a>";
-                        scores[i] = temp;
+                        links.push("<a href=" + String(scores[i][2]) + ">" + scores[i][1] + "</a>");
+                    }
+                    let page = Math.floor(offset/PAGE_SIZE);
+                    let pages = [];
+                    if (page > 0) {
+                        pages.push("<button onclick='show_page(" + (page - 1) + ")'>Previous</button>");
                     }
-                    document.getElementById("search").innerHTML="<br>"+scores.join("<br>");
+                    if (offset + scores.length < total) {
+                        pages.push("<button onclick='show_page(" + (page + 1) + ")'>Next</button>");
+                    }
+                    if (pages.length > 0) {
+                        links.push((offset + 1) + "-" + (offset + scores.length) + " of " + total + " " + pages.join(" "));
+                    }
+                    document.getElementById("search").innerHTML="<br>"+links.join("<br>");
                 }
                // let demo = document.getElementById("demo");
         """,
+    "DF_SKETCH":
+    """
+            df_sketch = {};
+        """,
     "TAIL":
     """     
             documents = {};
-            let bit_arrs = [];
-            let urls = [];
-            let titles = [];
-            get_document_object(documents);
+            const post_engine = start_engine();
+            post_engine({{type: "documents", documents: documents}});
             delete documents;
             // console.log(bit_arr.get_range(0, 50));
             // demo.innerHTML = bit_arr.bit_array;
             </script>
         </body>
         </html>
+        """,
+    "TAIL_BITSLICED":
+    """     
+            groups = {};
+            documents = {};
+            const post_engine = start_engine();
+            post_engine({{type: "groups", groups: groups, documents: documents}});
+            delete groups;
+            delete documents;
+            </script>
+        </body>
+        </html>
+        """,
+    "TAIL_SHARDED":
+    """     
+            const manifest = {};
+            const post_engine = start_engine();
+            post_engine({{type: "manifest", manifest: absolute_manifest(manifest)}});
+            document.getElementById('link_id').onfocus = () => post_engine({{type: "prefetch"}});
+            </script>
+        </body>
+        </html>
         """
 }
 if __name__ == "__main__":
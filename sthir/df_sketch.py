@@ -0,0 +1,101 @@
+"""
+Count-min sketch of the document frequencies of the words of a site.
+
+The IDF of a query word needs the number of documents holding it, which the
+search page would otherwise count by probing the filter of every document.
+The sketch answers with depth counters instead: row r has width counters and a
+word is counted in counter murmur3(word, seed=r) % width of every row, the hashes
+of the "standard" filters. Its estimate is the smallest of the counters.
+
+Every document adds 1 for each of its unique words with conservative update, only
+the smallest counters of a word grow (see spectral_bloom_filter._minimum_increment,
+the same as Minimum Increase for increments of 1). An estimate is never below the
+document frequency and counters saturate at 2**bits - 1.
+
+Its size does not depend on the vocabulary: with width = ceil(e / epsilon) counters
+per row, an estimate exceeds the document frequency by more than epsilon times the
+sum of the vocabulary sizes of the documents with probability at most exp(-depth)
+(Cormode and Muthukrishnan). Conservative update keeps most estimates exact well
+below that bound.
+
+Words ending in "*" are the prefixes of sthir.parse.prefixes, "filt*" counts the
+documents with a word starting with "filt".
+"""
+from math import ceil, e
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from sthir.generate_search import base2p15_encode_bytes
+from sthir.parse import PREFIX_MIN_LENGTH, prefixes
+from sthir.spectral_bloom_filter import Spectral_Bloom_Filter, _minimum_increment, counter_dtype, pack_counters
+
+# Rows of the sketch, a word is overestimated only if its counters collide in all of them
+DEPTH = 4
+# Widest counter, the page decodes counters of up to 16 bits
+MAX_BITS = 16
+# Error target of the sketch, as a fraction of the words counted (width ceil(e / EPSILON) = 13592)
+EPSILON = 0.0002
+# Most counters per row, whatever the error target
+MAX_WIDTH = 2**16
+
+
+def vocabulary(tokens: Iterable[str], prefix_length: int = 0) -> List[str]:
+    """
+    Sorted unique words of a document, with their prefixes (ending in "*") if prefix_length > 0
+    """
+    words = set(tokens)
+    keys = set(words)
+    if prefix_length > 0:
+        keys.update(prefix + "*" for prefix in prefixes(words, prefix_length))
+    return sorted(keys)
+
+
+def sketch_shape(documents: int, epsilon: float = EPSILON, depth: int = DEPTH) -> Tuple[int, int, int]:
+    """
+    Width, depth and bits per counter of the sketch of documents: ceil(e / epsilon) counters
+    per row (at most MAX_WIDTH), and enough bits to count every document (at most MAX_BITS)
+    """
+    return min(ceil(e / epsilon), MAX_WIDTH), depth, min(max(documents.bit_length(), 1), MAX_BITS)
+
+
+def build_sketch(vocabularies: Sequence[Sequence[str]], width: int, depth: int, bits: int) -> np.ndarray:
+    """
+    Counts the words of every document (see vocabulary) in a sketch
+
+    :returns: The depth * width counters, row after row
+    """
+    keys = sorted(set().union(*vocabularies))
+    counters = np.zeros(depth * width, dtype=counter_dtype(bits))
+    if not keys:
+        return counters
+    index = {key: i for i, key in enumerate(keys)}
+    rows = Spectral_Bloom_Filter().create_hashes_batch(keys, depth, width).astype(np.int64)
+    rows += np.arange(depth, dtype=np.int64) * width
+    for words in vocabularies:
+        if words:
+            _minimum_increment(counters, rows[[index[word] for word in words]],
+                               np.ones(len(words), dtype=np.int64), 2**bits - 1)
+    return counters
+
+
+def estimate(counters: np.ndarray, width: int, depth: int, words: Sequence[str]) -> np.ndarray:
+    """
+    Estimated document frequency of every word
+    """
+    if not words:
+        return np.zeros(0, dtype=counters.dtype)
+    rows = Spectral_Bloom_Filter().create_hashes_batch(list(words), depth, width).astype(np.int64)
+    return counters[rows + np.arange(depth, dtype=np.int64) * width].min(axis=1)
+
+
+def encode_sketch(counters: np.ndarray, width: int, depth: int, bits: int, documents: int,
+                  prefix_length: int = 0) -> list:
+    """
+    Entry of the sketch in the search page -
+    [base2p15 counters, width, depth, bits, documents, prefix min_length, prefix max_length]
+    """
+    return [
+        base2p15_encode_bytes(pack_counters(counters, bits)), width, depth, bits, documents,
+        PREFIX_MIN_LENGTH if prefix_length > 0 else 0, prefix_length
+    ]
@@ -5,7 +5,14 @@ This file contains methods for base2p15 encoding,a custom encoding that uses uni
 This encoding uses 2^15 unicode characters.
 The goal is to make binary representation of Spectral Bloom Filter, to a JS string as small as possible.
 """
-from typing import Iterable
+from typing import Iterable, Optional, Union
+
+import numpy as np
+from bitarray import bitarray
+
+OFFSET = 0xa1
+# Bit weights of one base2p15 character, most significant bit first
+_WEIGHTS = (1 << np.arange(14, -1, -1)).astype(np.uint32)
 
 def gen_chunks(string: str,
                chunk_size: int,
@@ -79,6 +86,58 @@ def base2p15_decode(base2p15: str) -> str:
     return bit_string
 
 
+def base2p15_encode_bytes(data: Union[bytes, bytearray, memoryview, bitarray],
+                          n_bits: Optional[int] = None) -> str:
+    """
+    Encode a packed bit buffer to base2p15, without going through a binary string.
+
+    Bits are read most significant first, so the output is identical to
+    ``base2p15_encode(bitarray.to01())`` for the same buffer.
+
+    :param data: Packed bits, e.g. the content of a .bin file or a bitarray
+    :type data: bytes, bytearray, memoryview or bitarray
+    :param n_bits: Number of bits of data to encode (default: all of them)
+    :type n_bits: int, optional
+    :returns: A base2p15 encoded string
+    :rtype: str
+    """
+    if isinstance(data, bitarray):
+        if n_bits is None:
+            n_bits = len(data)
+        endian = data.endian() if callable(data.endian) else data.endian
+        if endian != "big":
+            data = bitarray(data, endian="big")
+        data = data.tobytes()
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if n_bits is None:
+        n_bits = 8 * buffer.size
+    assert 0 <= n_bits <= 8 * buffer.size
+
+    padding_bits = (15 - n_bits % 15) % 15
+    bits = np.zeros(n_bits + padding_bits, dtype=np.uint32)
+    bits[:n_bits] = np.unpackbits(buffer)[:n_bits]
+    characters = bits.reshape(-1, 15) @ _WEIGHTS + OFFSET
+    return hex(padding_bits)[2:] + characters.astype("<u4").tobytes().decode("utf-32-le")
+
+
+def base2p15_decode_bytes(base2p15: str) -> bitarray:
+    """
+    Decode a base2p15 string straight to a bitarray, without going through a binary string.
+
+    :param base2p15: A base2p15 string, generated by base2p15_encode(_bytes)
+    :type base2p15: str
+    :returns: The decoded bits, ``.tobytes()`` gives them packed
+    :rtype: bitarray
+    """
+    padding = int(base2p15[0], 16)
+    characters = np.frombuffer(base2p15[1:].encode("utf-32-le"), dtype="<u4") - OFFSET
+    bits = ((characters[:, None] & _WEIGHTS) != 0).ravel()
+    decoded = bitarray(endian="big")
+    decoded.frombytes(np.packbits(bits).tobytes())
+    del decoded[bits.size - padding:]
+    return decoded
+
+
 def base2p15_get_range(base2p15: str, start: int, end: int) -> str:
     """
     Get a range of bits from [start,end)
@@ -1,4 +1,8 @@
 #https://stackoverflow.com/questions/13305290/is-there-a-pure-python-implementation-of-murmurhash?rq=1
+from typing import Iterable, Sequence
+
+import numpy as np
+
 
 def murmur3_x86_32(key, seed = 0):
     c1 = 0xcc9e2d51
@@ -48,6 +52,84 @@ def murmur3_x86_32(key, seed = 0):
 
     return h1 & 0xffffffff
 
+def _rotl32(x, r):
+    return (x << np.uint32(r)) | (x >> np.uint32(32 - r))
+
+
+def _fmix32(h):
+    h ^= h >> np.uint32(16)
+    h *= np.uint32(0x85ebca6b)
+    h ^= h >> np.uint32(13)
+    h *= np.uint32(0xc2b2ae35)
+    h ^= h >> np.uint32(16)
+    return h
+
+
+def murmur3_x86_32_batch(keys: Sequence[str], seeds: Iterable[int]) -> np.ndarray:
+    """
+    Vectorized murmur3_x86_32 over a whole vocabulary and a range of seeds.
+
+    Gives the same 32-bit values as murmur3_x86_32 (and as the JS
+    ``murmurHash3.x86.hash32`` used in the search page), i.e. only the
+    low byte of every character code is mixed in.
+
+    :param keys: Words to hash
+    :param seeds: Seeds to hash every word with, e.g. range(k)
+    :returns: uint32 matrix of shape (len(keys), len(seeds))
+    """
+    seeds = np.asarray(list(seeds), dtype=np.uint32)
+    n = len(keys)
+    if n == 0 or seeds.size == 0:
+        return np.zeros((n, seeds.size), dtype=np.uint32)
+
+    lengths = np.fromiter(map(len, keys), dtype=np.int64, count=n)
+    # Keys are hashed in groups of lengths within a factor of two, so a single
+    # long key does not pad every other key to its length
+    groups = np.frexp(lengths)[1]  # bit length of every length
+    hashes = np.empty((n, seeds.size), dtype=np.uint32)
+    for group in np.unique(groups):
+        members = np.flatnonzero(groups == group)
+        hashes[members] = _murmur3_x86_32_group([keys[i] for i in members], lengths[members], seeds)
+    return hashes
+
+
+def _murmur3_x86_32_group(keys: Sequence[str], lengths: np.ndarray, seeds: np.ndarray) -> np.ndarray:
+    """
+    murmur3_x86_32_batch of keys with the given lengths, padded to the longest of them
+    """
+    n = len(keys)
+    width = int(lengths.max()) + 4
+    # One row of character codes per key, zero padded to a common width
+    codes = np.zeros((n, width), dtype=np.uint32)
+    flat = np.frombuffer("".join(keys).encode("utf-32-le"), dtype=np.uint32)
+    rows = np.repeat(np.arange(n), lengths)
+    cols = np.arange(flat.size) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    codes[rows, cols] = flat & 0xff
+
+    c1, c2 = np.uint32(0xcc9e2d51), np.uint32(0x1b873593)
+    h1 = np.broadcast_to(seeds, (n, seeds.size)).copy()
+    rounded_end = lengths & ~3
+
+    with np.errstate(over="ignore"):
+        for i in range(0, int(rounded_end.max()), 4):
+            active = rounded_end > i
+            k1 = codes[:, i] | (codes[:, i + 1] << np.uint32(8)) | \
+                 (codes[:, i + 2] << np.uint32(16)) | (codes[:, i + 3] << np.uint32(24))
+            k1 = _rotl32(k1 * c1, 15) * c2
+            mixed = _rotl32(h1 ^ k1[:, None], 13) * np.uint32(5) + np.uint32(0xe6546b64)
+            h1 = np.where(active[:, None], mixed, h1)
+
+        # tail, the padding past each key is zero so it can be read blindly
+        tail = np.arange(n)
+        k1 = codes[tail, rounded_end] | (codes[tail, rounded_end + 1] << np.uint32(8)) | \
+             (codes[tail, rounded_end + 2] << np.uint32(16))
+        k1 = _rotl32(k1 * c1, 15) * c2
+        h1 = np.where((lengths & 3)[:, None] != 0, h1 ^ k1[:, None], h1)
+
+        # finalization
+        h1 ^= lengths.astype(np.uint32)[:, None]
+        return _fmix32(h1)
+
 # if __name__ == '__main__':
 #     for i in range(3):
 #         print( murmur3_x86_32('Mrunank' , i) )
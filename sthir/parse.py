@@ -1,3 +1,4 @@
+import lxml.html
 from bs4 import BeautifulSoup
 from newspaper import Article
 
@@ -6,57 +7,261 @@ from nltk.corpus import stopwords
 from nltk.tokenize import RegexpTokenizer
 from nltk.stem import WordNetLemmatizer 
 
+from functools import lru_cache
 from string import ascii_lowercase,digits
-from typing import Iterable , List
+from typing import Callable , FrozenSet , Iterable , Iterator , List , Optional , Set , Tuple
 
-def extract_html_bs4(html_file_path: str, remove_stopwords: bool = True,enable_lemmetization:bool=False):
+# Text extraction backends accepted by parse_html
+BACKENDS = ("bs4", "lxml", "newspaper")
+
+# Bound on the number of memoized lemmatize_word results
+LEMMA_CACHE_SIZE = 2 ** 16
+
+# Shortest prefix put in the prefix filters, shorter ones would match nearly every document
+PREFIX_MIN_LENGTH = 3
+
+@lru_cache(maxsize=None)
+def get_stopwords(language: str = "english") -> FrozenSet[str]:
     """
-    Given a path to html file it will extract all text in it and return a list of words
+    Returns the NLTK stopwords of the language, loaded from the corpus once per process
+    """
+    return frozenset(stopwords.words(language))
+
+@lru_cache(maxsize=None)
+def get_tokenizer(pattern: str = r'\w+') -> RegexpTokenizer:
+    """
+    Returns a RegexpTokenizer for the pattern, shared across documents
+    """
+    return RegexpTokenizer(pattern)
+
+@lru_cache(maxsize=None)
+def get_lemmatizer() -> WordNetLemmatizer:
+    """
+    Returns the WordNetLemmatizer shared across documents
+    """
+    return WordNetLemmatizer()
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def lemmatize_word(word: str) -> str:
+    """
+    Lemmatizes a single word with the shared lemmatizer, results are memoized
+    as the same words repeat across documents. Ex: cats->cat
+    """
+    return get_lemmatizer().lemmatize(word)
+
+def lines_bs4(html_file_path: str) -> Iterator[str]:
+    """
+    Extraction stage, yields the stripped lines of text of an html file
     (using library: BeautifulSoup4)
 
     :param html_file_path: Path to html file, will be called with open()
     :type html_file_path: str
-    :param remove_stopwords: Will remove stopwords like ["the", "them",etc], defaults to False
-    :type remove_stopwords: bool, optional
-    :param enable_lemmetization: Will lemmetize words if set to True. Ex: cats->cat, defaults to False
-    :type enable_lemmetization: bool, optional
-    :return: A list of words all in lowercase
-    :rtype: List[str]
     """
     # Following: https://stackoverflow.com/questions/328356/extracting-text-from-html-file-using-python
     # By PeYoTlL
-    invalid_words = set(stopwords.words("english") + ['', ""])
-
     with open(html_file_path , encoding='utf8') as html_file:
         soup = BeautifulSoup(html_file, features="lxml")
 
     for script in soup(["script", "style"]):
         script.extract()
 
-    text = soup.get_text()
+    for line in soup.get_text().splitlines():
+        yield line.strip()
 
-    # Extracting lines
-    lines = [line.strip() for line in text.splitlines()]
+def lines_newspaper(html_file_path: str) -> Iterator[str]:
+    """
+    Extraction stage, yields the stripped words of the article text of an html file
+    (using library: Newspaper3k)
 
-    # Tokenizing words
-    tokenizer = RegexpTokenizer(r'\w+')
-    chunks = [tokenizer.tokenize(line.lower()) for line in lines]
+    :param html_file_path: Path to html file, will be called with open()
+    :type html_file_path: str
+    """
+    article = Article(url="")
+    with open(html_file_path, "r" , encoding='utf8') as html_file:
+        article.set_html(html_file.read())
+    article.parse()
 
-    # Flatten
-    chunks = sum(chunks, [])
+    for line in word_tokenize(article.text):
+        yield line.strip()
 
-    # Remove stopwords
-    if remove_stopwords:
-        chunks = [
-            chunk for chunk in chunks if chunk not in list(invalid_words)
-        ]
+def document_lxml(html_file_path: str) -> Tuple[List[str], Optional[str]]:
+    """
+    Extraction stage parsing the html file once with lxml directly,
+    returns its stripped lines of text (as lines_bs4) along with its title
+
+    :param html_file_path: Path to html file, decoded as utf8 like lines_bs4
+    :type html_file_path: str
+    :return: The lines of text and the text of the <title> tag
+    """
+    parser = lxml.html.HTMLParser(encoding='utf8')
+    root = lxml.html.parse(html_file_path, parser=parser).getroot()
+    if root is None:
+        return [], None
+
+    title = root.find(".//title")
+    title = title.text if title is not None else None
+
+    # BeautifulSoup's get_text also leaves out the content of <template> tags
+    for script in root.xpath("//script|//style|//template"):
+        # drop_tree keeps the text following the tag, as BeautifulSoup's extract
+        script.drop_tree()
+
+    lines = [line.strip() for line in root.text_content().splitlines()]
+    return lines, title
+
+def get_title(html_file_path: str) -> Optional[str]:
+    """
+    Returns the text of the <title> tag of an html file, None if it has none
+    """
+    title = lxml.html.parse(html_file_path).find(".//title")
+    return title.text if title is not None else None
+
+def lowercase(lines: Iterable[str]) -> Iterator[str]:
+    """Lowercase stage"""
+    for line in lines:
+        yield line.lower()
+
+def tokenize(lines: Iterable[str], pattern: str = r'\w+') -> Iterator[str]:
+    """Tokenizing stage, yields the words of every line"""
+    tokenizer = get_tokenizer(pattern)
+    for line in lines:
+        yield from tokenizer.tokenize(line)
+
+def drop_stopwords(tokens: Iterable[str], invalid_words: Optional[Set[str]] = None) -> Iterator[str]:
+    """
+    Stopword filtering stage, invalid_words should be a set for O(1) lookups
+    (default: the cached english stopwords)
+    """
+    if invalid_words is None:
+        invalid_words = get_stopwords()
+    for token in tokens:
+        if token not in invalid_words:
+            yield token
+
+def lemmatize(tokens: Iterable[str], lemmatizer=None) -> Iterator[str]:
+    """
+    Lemmatization stage. Ex: cats->cat
+    Uses the memoized lemmatize_word unless a lemmatizer is given.
+    """
+    lemma = lemmatizer.lemmatize if lemmatizer is not None else lemmatize_word
+    for token in tokens:
+        yield lemma(token)
+
+def prefixes(tokens: Iterable[str], max_length: int, min_length: Optional[int] = None) -> Iterator[str]:
+    """
+    Prefix stage, yields the prefixes of min_length to max_length characters of every token,
+    the token itself when it is not longer (default min_length: PREFIX_MIN_LENGTH)
+    """
+    if min_length is None:
+        min_length = PREFIX_MIN_LENGTH
+    for token in tokens:
+        for length in range(min_length, min(len(token), max_length) + 1):
+            yield token[:length]
+
+def pipeline(source: Iterable[str], *stages: Callable[[Iterable[str]], Iterable[str]]) -> Iterator[str]:
+    """
+    Chains generator stages lazily, each stage consumes the output of the previous one.
 
-    #Lemmatization   
+    >>> list(pipeline(["The Cats", "sat"], lowercase, tokenize))
+    ['the', 'cats', 'sat']
+    """
+    stream = iter(source)
+    for stage in stages:
+        stream = stage(stream)
+    return stream
+
+def iter_tokens(lines: Iterable[str],
+                remove_stopwords: bool = True,
+                enable_lemmetization: bool = False) -> Iterator[str]:
+    """
+    Lazily turns extracted lines into tokens: lowercase, tokenize, stopword filter and lemmatize
+
+    :param lines: Output of an extraction stage like lines_bs4
+    :param remove_stopwords: Will remove stopwords like ["the", "them",etc], defaults to True
+    :param enable_lemmetization: Will lemmetize words if set to True. Ex: cats->cat, defaults to False
+    :return: A generator of words all in lowercase
+    """
+    stages = [lowercase, tokenize]
+    if remove_stopwords:
+        stages.append(drop_stopwords)
     if enable_lemmetization:
-        lemmatizer = WordNetLemmatizer() 
-        chunks = [ lemmatizer.lemmatize(chunk) for chunk in chunks ]
+        stages.append(lemmatize)
+    return pipeline(lines, *stages)
+
+def iter_html_bs4(html_file_path: str, remove_stopwords: bool = True,
+                  enable_lemmetization: bool = False) -> Iterator[str]:
+    """
+    Generator version of extract_html_bs4, tokens are produced while the caller consumes them.
+    Can be passed directly to Spectral_Bloom_Filter.create_filter.
+    """
+    return iter_tokens(lines_bs4(html_file_path), remove_stopwords, enable_lemmetization)
+
+def iter_html_newspaper(html_file: str, remove_stopwords: bool = True,
+                        enable_lemmetization: bool = False) -> Iterator[str]:
+    """
+    Generator version of extract_html_newspaper
+    """
+    return iter_tokens(lines_newspaper(html_file), remove_stopwords, enable_lemmetization)
+
+def parse_html(html_file_path: str,
+               backend: str = "bs4",
+               remove_stopwords: bool = True,
+               enable_lemmetization: bool = False) -> Tuple[Iterator[str], Optional[str]]:
+    """
+    Lazily tokenizes an html file with the chosen text extraction backend and returns its title
+
+    The "lxml" backend parses the file once for both the tokens and the title,
+    the "bs4" and "newspaper" backends parse it a second time for the title.
 
-    return chunks
+    :param html_file_path: Path to html file
+    :param backend: One of BACKENDS, defaults to "bs4"
+    :param remove_stopwords: Will remove stopwords like ["the", "them",etc], defaults to True
+    :param enable_lemmetization: Will lemmetize words if set to True. Ex: cats->cat, defaults to False
+    :return: A generator of words all in lowercase and the title of the file
+    """
+    if backend == "lxml":
+        lines, title = document_lxml(html_file_path)
+    elif backend == "bs4":
+        lines, title = lines_bs4(html_file_path), get_title(html_file_path)
+    elif backend == "newspaper":
+        lines, title = lines_newspaper(html_file_path), get_title(html_file_path)
+    else:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    return iter_tokens(lines, remove_stopwords, enable_lemmetization), title
+
+def extract_html_lxml(html_file_path: str, remove_stopwords: bool = True,
+                      enable_lemmetization: bool = False) -> List[str]:
+    """
+    Given a path to html file it will extract all text in it and return a list of words
+    (using library: lxml)
+
+    :param html_file_path: Path to html file
+    :type html_file_path: str
+    :param remove_stopwords: Will remove stopwords like ["the", "them",etc], defaults to True
+    :type remove_stopwords: bool, optional
+    :param enable_lemmetization: Will lemmetize words if set to True. Ex: cats->cat, defaults to False
+    :type enable_lemmetization: bool, optional
+    :return: A list of words all in lowercase
+    :rtype: List[str]
+    """
+    lines, _ = document_lxml(html_file_path)
+    return list(iter_tokens(lines, remove_stopwords, enable_lemmetization))
+
+def extract_html_bs4(html_file_path: str, remove_stopwords: bool = True,enable_lemmetization:bool=False):
+    """
+    Given a path to html file it will extract all text in it and return a list of words
+    (using library: BeautifulSoup4)
+
+    :param html_file_path: Path to html file, will be called with open()
+    :type html_file_path: str
+    :param remove_stopwords: Will remove stopwords like ["the", "them",etc], defaults to False
+    :type remove_stopwords: bool, optional
+    :param enable_lemmetization: Will lemmetize words if set to True. Ex: cats->cat, defaults to False
+    :type enable_lemmetization: bool, optional
+    :return: A list of words all in lowercase
+    :rtype: List[str]
+    """
+    return list(iter_html_bs4(html_file_path, remove_stopwords, enable_lemmetization))
 
 def extract_html_newspaper(html_file: str,
                            remove_stopwords=True, 
@@ -72,36 +277,7 @@ def extract_html_newspaper(html_file: str,
     :return: A list of words all in lowercase
     :rtype: List[str]
     """
-    invalid_words = set(stopwords.words("english"))
-
-    article = Article(url="")
-    # with open(html_file_path, encoding='utf8') as html_file:
-    article.set_html(open(html_file, "r" , encoding='utf8').read())
-    article.parse()
-    text = article.text
-
-    lines = word_tokenize(text)
-    lines = [line.strip() for line in lines]
-
-    # Tokenizing words
-    tokenizer = RegexpTokenizer(r'\w+')
-    chunks = [tokenizer.tokenize(line.lower()) for line in lines]
-
-    # Flatten
-    chunks = sum(chunks, [])
-
-    # Remove stopwords
-    if remove_stopwords:
-        chunks = [
-            chunk for chunk in chunks if chunk not in list(invalid_words)
-        ]
-
-    #Lemmatization   
-    if enable_lemmetization:
-        lemmatizer = WordNetLemmatizer() 
-        chunks = [ lemmatizer.lemmatize(chunk) for chunk in chunks ]
-
-    return chunks
+    return list(iter_html_newspaper(html_file, remove_stopwords, enable_lemmetization))
 
 if __name__ == "__main__":
     import requests
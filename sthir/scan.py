@@ -1,24 +1,42 @@
 # import convert_2p15
+import base64
 import glob
+import gzip
+import hashlib
+import io
 import json
+import os
+import struct
 import time
-from math import log
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter
+from functools import partial
 
-import lxml.html
 import requests
-from bitarray import bitarray
 
+import sthir.bit_sliced as bit_sliced
 import sthir.convert_2p15 as convert_2p15
+import sthir.df_sketch as count_min_sketch
 import sthir.parse as parse
+import sthir.search_index as search_index
+import sthir.sizing as sizing
 import sthir.spectral_bloom_filter as spectral_bloom_filter
-from sthir.generate_search import base2p15_encode
+import sthir.variable_counters as variable_counters
+from sthir.generate_search import base2p15_decode_bytes, base2p15_encode_bytes
+
+
+# Bumped whenever the documents array entry changes shape
+MANIFEST_VERSION = 1
+
+# Build parameters which change the tokens of a file
+TOKEN_PARAMS = ("remove_stopwords", "enable_lemmetization", "backend")
 
 
 def get_all_html_files(directory):
     """
-    Returns list of html files located in the directory
+    Returns the sorted list of html files located in the directory
     """
-    return glob.glob(directory + "/*.html")
+    return sorted(glob.glob(directory + "/*.html"))
 
 
 def get_all_bin_files(directory):
@@ -31,35 +49,423 @@ def get_all_bin_files(directory):
 def generate_bloom_filter(file,
                           false_positive=0.1,
                           chunk_size=4,
-                          remove_stopwords=True):
+                          remove_stopwords=True,
+                          hashing="standard",
+                          enable_lemmetization=False,
+                          backend="bs4",
+                          counter_format="fixed",
+                          max_bytes=None,
+                          prefix_length=0,
+                          prefix_false_positive=None):
     """
     |  Generates a bloom filter and saves it in .bin file.
     |  The saved .bin filename is same as that of the .html file name.
     |  Returns a dictionary containing the - 
-    |  length of the bitarray (m), no of hash functions used (k), chunk size (chunk_size), binary file name (bin_file), and HTML file's title (title).
+    |  length of the bitarray (m), no of hash functions used (k), chunk size (chunk_size), binary file name (bin_file), HTML file's title (title)
+    |  and the hashing scheme used to derive the k indices (hashing).
+    |  The text is extracted with the parse.BACKENDS backend, "lxml" parses the file only once.
+    |  With counter_format "elias" the .bin file holds gamma coded counters and the dictionary
+    |  also has their block index (index) - [block_size, offset_width, base2p15 offsets].
+    |  max_bytes caps the size of the filter, see sthir.sizing.choose.
+    |  If prefix_length is greater than 0, the prefixes of parse.PREFIX_MIN_LENGTH to prefix_length
+    |  characters of every token are counted in a second filter (prefix_false_positive, the same
+    |  chunk_size and hashing, fixed counters), the dictionary then also has
+    |  prefix - [base2p15 filter, m, k, min_length, max_length] and its size in bytes (prefix_bytes).
 
     This method is internally used in method - create_search_page
     """
     spectral = spectral_bloom_filter.Spectral_Bloom_Filter()
-    tokens = parse.extract_html_bs4(file,
-                                          remove_stopwords=remove_stopwords)
-
-    title = lxml.html.parse(file).find(".//title").text
+    tokens, title = parse.parse_html(file,
+                                     backend=backend,
+                                     remove_stopwords=remove_stopwords,
+                                     enable_lemmetization=enable_lemmetization)
+    if title is None:
+        title = os.path.basename(file)
+    if prefix_length > 0:
+        # Read twice, for the words and for their prefixes
+        tokens = list(tokens)
 
     sbf = spectral.create_filter(tokens=tokens,
                                  chunk_size=chunk_size,
                                  p=false_positive,
                                  to_bitarray=True,
-                                 bitarray_path=file.replace(".html", ".bin"))
-    m, n = len(sbf), len(tokens)
-    k = round((m / n) * log(2))  # From spectral_bloom_filter.optimal_m_k
-    return {
-        "m": m,
-        "k": k,
+                                 bitarray_path=file.replace(".html", ".bin"),
+                                 hashing=hashing,
+                                 counter_format=counter_format,
+                                 max_bytes=max_bytes)
+    document = {
+        "m": spectral.m,
+        "k": spectral.k,
         "chunk_size": chunk_size,
         "bin_file": file.replace(".html", ".bin"),
         "title": title,
-        "no_items": n,
+        "no_items": spectral.no_items,
+        "hashing": hashing,
+        "counter_format": counter_format,
+    }
+    if counter_format == "elias":
+        offsets, width = variable_counters.encode_index(variable_counters.block_offsets(sbf))
+        document["index"] = [variable_counters.BLOCK_SIZE, width, offsets]
+    if prefix_length > 0:
+        prefix_spectral = spectral_bloom_filter.Spectral_Bloom_Filter()
+        counters = prefix_spectral.create_filter(
+            tokens=parse.prefixes(tokens, prefix_length),
+            chunk_size=chunk_size,
+            p=false_positive if prefix_false_positive is None else prefix_false_positive,
+            to_bitarray=False,
+            hashing=hashing)
+        packed = spectral_bloom_filter.pack_counters(counters, chunk_size)
+        document["prefix"] = [
+            base2p15_encode_bytes(packed), prefix_spectral.m, prefix_spectral.k,
+            parse.PREFIX_MIN_LENGTH, prefix_length
+        ]
+        document["prefix_bytes"] = len(packed)
+    return document
+
+
+def scan_document(file,
+                  false_positive=0.1,
+                  chunk_size=4,
+                  remove_stopwords=True,
+                  hashing="standard",
+                  enable_lemmetization=False,
+                  backend="bs4",
+                  counter_format="fixed",
+                  max_bytes=None,
+                  prefix_length=0,
+                  prefix_false_positive=None):
+    """
+    |  Builds the bloom filter of a single HTML file (see generate_bloom_filter)
+    |  and returns its entry of the documents array in the search page - 
+    |  [base2p15 filter, chunk_size, m, k, bin_file, title, no_items, hashing].
+    |  Gamma coded filters have a ninth item - ["elias", block_size, offset_width, base2p15 offsets].
+    |  With prefix_length the ninth item is ["fixed"] for fixed counters, and the tenth is the prefix
+    |  filter - ["prefix", base2p15 filter, m, k, min_length, max_length].
+
+    This method is internally used in method - create_search_page
+    """
+    document = generate_bloom_filter(file,
+                                     false_positive=false_positive,
+                                     chunk_size=chunk_size,
+                                     remove_stopwords=remove_stopwords,
+                                     hashing=hashing,
+                                     enable_lemmetization=enable_lemmetization,
+                                     backend=backend,
+                                     counter_format=counter_format,
+                                     max_bytes=max_bytes,
+                                     prefix_length=prefix_length,
+                                     prefix_false_positive=prefix_false_positive)
+    with open(document["bin_file"], "rb") as f:
+        packed = f.read()
+
+    entry = [
+        base2p15_encode_bytes(packed), document["chunk_size"],
+        document["m"], document["k"], document["bin_file"],
+        document["title"], document["no_items"], document["hashing"]
+    ]
+    if counter_format == "elias":
+        entry.append(["elias"] + document["index"])
+    if prefix_length > 0:
+        if len(entry) == 8:
+            entry.append(["fixed"])
+        entry.append(["prefix"] + document["prefix"])
+    return entry
+
+
+def get_entry_sizes(entry):
+    """
+    |  Returns the bytes of the filter of a documents array entry (see scan_document)
+    |  and of its prefix filter, 0 if it has none.
+    """
+    prefix = entry[9] if len(entry) > 9 else None
+    return (len(base2p15_decode_bytes(entry[0]).tobytes()),
+            len(base2p15_decode_bytes(prefix[1]).tobytes()) if prefix else 0)
+
+
+def count_tokens(file,
+                 remove_stopwords=True,
+                 enable_lemmetization=False,
+                 backend="bs4"):
+    """
+    |  Returns the token frequencies (a Counter) and the title of an HTML file.
+
+    This method is internally used to build the bit-sliced layout of create_search_page
+    """
+    tokens, title = parse.parse_html(file,
+                                     backend=backend,
+                                     remove_stopwords=remove_stopwords,
+                                     enable_lemmetization=enable_lemmetization)
+    if title is None:
+        title = os.path.basename(file)
+    return Counter(tokens), title
+
+
+def count_unique_tokens(file,
+                        remove_stopwords=True,
+                        enable_lemmetization=False,
+                        backend="bs4"):
+    """
+    |  Returns the number of unique tokens of an HTML file, the n its filter is sized for.
+
+    This method is internally used to spread a byte budget in create_search_page
+    """
+    return len(count_tokens(file, remove_stopwords, enable_lemmetization, backend)[0])
+
+
+def get_vocabulary(file,
+                   remove_stopwords=True,
+                   enable_lemmetization=False,
+                   backend="bs4",
+                   prefix_length=0):
+    """
+    |  Returns the sorted unique tokens of an HTML file, and their prefixes if prefix_length
+    |  is greater than 0 (see sthir.df_sketch.vocabulary).
+
+    This method is internally used to build the document frequency sketch of create_search_page
+    """
+    tokens, _ = parse.parse_html(file,
+                                 backend=backend,
+                                 remove_stopwords=remove_stopwords,
+                                 enable_lemmetization=enable_lemmetization)
+    return count_min_sketch.vocabulary(tokens, prefix_length)
+
+
+def create_df_sketch(files,
+                     remove_stopwords=True,
+                     jobs=1,
+                     enable_lemmetization=False,
+                     backend="bs4",
+                     prefix_length=0,
+                     vocabularies=None,
+                     epsilon=count_min_sketch.EPSILON):
+    """
+    |  Builds the count-min sketch of the document frequencies of the words of the HTML files
+    |  (see sthir.df_sketch), ceil(e / epsilon) counters wide, and returns its entry in the search page.
+    |  vocabularies holds the vocabularies of the files already read (see get_vocabulary),
+    |  by file, only the others are tokenized and added to it.
+
+    This method is internally used in method - create_search_page
+    """
+    if vocabularies is None:
+        vocabularies = {}
+    read = partial(get_vocabulary,
+                   remove_stopwords=remove_stopwords,
+                   enable_lemmetization=enable_lemmetization,
+                   backend=backend,
+                   prefix_length=prefix_length)
+    missing = [file for file in files if file not in vocabularies]
+    if jobs > 1 and len(missing) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            vocabularies.update(zip(missing, pool.map(read, missing)))
+    else:
+        vocabularies.update(zip(missing, map(read, missing)))
+    vocabularies = [vocabularies[file] for file in files]
+
+    width, depth, bits = count_min_sketch.sketch_shape(len(files), epsilon)
+    counters = count_min_sketch.build_sketch(vocabularies, width, depth, bits)
+    print("Document frequency sketch: {} bytes, {} x {} counters of {} bits".format(
+        sizing.filter_bytes(width * depth, bits), depth, width, bits))
+    return count_min_sketch.encode_sketch(counters, width, depth, bits, len(files), prefix_length)
+
+
+def allocate_budget(files,
+                    total_bytes,
+                    false_positive=0.1,
+                    chunk_size=4,
+                    remove_stopwords=True,
+                    jobs=1,
+                    enable_lemmetization=False,
+                    backend="bs4",
+                    unique_counts=None):
+    """
+    |  Spreads total_bytes over the filters of the HTML files (see sthir.sizing.allocate).
+    |  Returns the max_bytes of every file, in order.
+    |  unique_counts holds the unique tokens of the files already counted, by file, only the
+    |  others are tokenized and added to it.
+
+    This method is internally used in method - create_search_page
+    """
+    if unique_counts is None:
+        unique_counts = {}
+    count = partial(count_unique_tokens,
+                    remove_stopwords=remove_stopwords,
+                    enable_lemmetization=enable_lemmetization,
+                    backend=backend)
+    missing = [file for file in files if file not in unique_counts]
+    if jobs > 1 and len(missing) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            unique_counts.update(zip(missing, pool.map(count, missing)))
+    else:
+        unique_counts.update(zip(missing, map(count, missing)))
+    return [
+        size.bytes for size in sizing.allocate([unique_counts[file] for file in files], total_bytes,
+                                               false_positive, chunk_size)
+    ]
+
+
+def create_bitsliced_index(files,
+                           false_positive=0.1,
+                           chunk_size=4,
+                           remove_stopwords=True,
+                           hashing="standard",
+                           jobs=1,
+                           enable_lemmetization=False,
+                           backend="bs4"):
+    """
+    |  Builds the bit-sliced layout (see sthir.bit_sliced) of the HTML files.
+    |  Returns the group entries and the [url, title] of every document, in group order.
+
+    This method is internally used in method - create_search_page
+    """
+    count = partial(count_tokens,
+                    remove_stopwords=remove_stopwords,
+                    enable_lemmetization=enable_lemmetization,
+                    backend=backend)
+    if jobs > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            counted = list(pool.map(count, files))
+    else:
+        counted = list(map(count, files))
+
+    groups = bit_sliced.build_groups([tokens for tokens, _ in counted],
+                                     p=false_positive,
+                                     chunk_size=chunk_size,
+                                     hashing=hashing)
+    group_entries, documents = list(), list()
+    for docs, entry in groups:
+        group_entries.append(entry)
+        for doc in docs:
+            documents.append([files[doc], counted[doc][1]])
+            print("Scanned: {}".format(files[doc]))
+    return group_entries, documents
+
+
+def get_manifest_path(output_file):
+    """
+    Returns the path of the build manifest kept next to the output file
+    """
+    return os.path.splitext(output_file)[0] + ".manifest.json"
+
+
+def hash_file(file):
+    """
+    Returns the SHA-256 hex digest of the file's content
+    """
+    digest = hashlib.sha256()
+    with open(file, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_file):
+    """
+    |  Returns the documents of a build manifest, keyed by HTML file path.
+    |  Each one holds the content hash (hash), build parameters (params) and
+    |  the documents array entry (entry) of that file, its unique tokens
+    |  (no_unique_items) if they were counted for a byte budget and its
+    |  vocabulary (vocabulary) if it was read for the document frequency sketch.
+    |  A missing or unreadable manifest is treated as empty.
+    """
+    try:
+        with open(manifest_file, encoding='utf8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest["documents"]
+
+
+def save_manifest(manifest_file, documents):
+    """
+    Saves the build manifest written by create_search_page(incremental=True)
+    """
+    with open(manifest_file, "w", encoding='utf8') as f:
+        json.dump({"version": MANIFEST_VERSION, "documents": documents},
+                  f,
+                  ensure_ascii=False)
+
+
+def get_shard_dir(output_file):
+    """
+    Returns the directory holding the filter shards of a sharded search page
+    """
+    return os.path.splitext(output_file)[0] + "_shards"
+
+
+def gzip_bytes(data, compresslevel=9):
+    """
+    |  Returns data gzip compressed with a zero modification time, so that the output is
+    |  identical between builds (gzip.compress only takes mtime from Python 3.8).
+    """
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=compresslevel, mtime=0) as f:
+        f.write(data)
+    return buffer.getvalue()
+
+
+def compress_documents(base2p15_arrs):
+    """
+    |  Packs documents array entries into one gzip blob, read in the page by read_compressed -
+    |  the header length (4 bytes, big-endian), the JSON entries with the byte length of
+    |  every filter in place of its base2p15 string, then the filters' bytes.
+    |  Compressing the bytes instead of the base2p15 text saves about a third more.
+    """
+    filters = [base2p15_decode_bytes(entry[0]).tobytes() for entry in base2p15_arrs]
+    header = json.dumps([[len(data)] + entry[1:] for data, entry in zip(filters, base2p15_arrs)],
+                        ensure_ascii=False).encode("utf8")
+    return gzip_bytes(struct.pack(">I", len(header)) + header + b"".join(filters))
+
+
+def write_shards(base2p15_arrs, output_file, shard_size, compress=False):
+    """
+    |  Writes the documents array entries in groups of shard_size to JSON files
+    |  (or compress_documents blobs if compress) in get_shard_dir(output_file),
+    |  replacing the shards of earlier builds.
+    |  Returns the manifest embedded in the search page - the shard paths
+    |  (relative to the search page), their number of documents and, if compressed, the compression.
+    """
+    shard_dir = get_shard_dir(output_file)
+    os.makedirs(shard_dir, exist_ok=True)
+    for old_shard in glob.glob(os.path.join(shard_dir, "shard_*.json")) + glob.glob(
+            os.path.join(shard_dir, "shard_*.gz")):
+        os.remove(old_shard)
+
+    shards = list()
+    for number, start in enumerate(range(0, len(base2p15_arrs), shard_size)):
+        documents = base2p15_arrs[start:start + shard_size]
+        if compress:
+            name = "shard_{:04d}.gz".format(number)
+            with open(os.path.join(shard_dir, name), "wb") as f:
+                f.write(compress_documents(documents))
+        else:
+            name = "shard_{:04d}.json".format(number)
+            with open(os.path.join(shard_dir, name), "w", encoding='utf8') as f:
+                json.dump(documents, f, ensure_ascii=False)
+        shards.append({
+            "file": os.path.basename(shard_dir) + "/" + name,
+            "documents": len(documents)
+        })
+    manifest = {"shards": shards, "documents": len(base2p15_arrs)}
+    if compress:
+        manifest["compression"] = "gzip"
+    return manifest
+
+
+def inline_compressed(base2p15_arrs):
+    """
+    |  Returns the manifest of a page with all the filters in one compress_documents blob,
+    |  inlined as a base64 data URL which the page reads like a single shard.
+    """
+    blob = base64.b64encode(compress_documents(base2p15_arrs)).decode("ascii")
+    return {
+        "shards": [{
+            "file": "data:application/gzip;base64," + blob,
+            "documents": len(base2p15_arrs)
+        }],
+        "documents": len(base2p15_arrs),
+        "compression": "gzip"
     }
 
 
@@ -67,7 +473,23 @@ def create_search_page(directory,
                        output_file="search.html",
                        false_positive=0.1,
                        chunk_size=4,
-                       remove_stopwords=True):
+                       remove_stopwords=True,
+                       hashing="standard",
+                       jobs=1,
+                       enable_lemmetization=False,
+                       incremental=False,
+                       backend="bs4",
+                       shard_size=0,
+                       layout="documents",
+                       counter_format="fixed",
+                       compress=False,
+                       index_file=None,
+                       max_bytes=None,
+                       total_bytes=None,
+                       prefix_length=0,
+                       prefix_false_positive=None,
+                       df_sketch=False,
+                       df_sketch_error=count_min_sketch.EPSILON):
     """
     Generates the search output file using the directory path.
 
@@ -82,34 +504,235 @@ def create_search_page(directory,
                        Default of 4 means that the maximum increment a counter can perform is 2**4, which is 16.
     :param remove_stopwords: To remove stopwords
                              (Default - True)
+    :param hashing: Scheme used to derive the k hash indices, "standard" or "double"
+                    (Default - "standard")
+                    "double" computes only two murmur hashes per word, at build time and in the browser.
+    :param jobs: Number of worker processes scanning documents in parallel
+                 (Default - 1)
+                 The output is identical to a serial build.
+    :param enable_lemmetization: To lemmatize words, Ex: cats->cat
+                                 (Default - False)
+    :param incremental: Keep a build manifest next to the output file (see get_manifest_path)
+                        and only rescan files whose content or build parameters changed
+                        (Default - False)
+                        The output is identical to a full build.
+    :param backend: HTML text extraction backend, "bs4", "lxml" or "newspaper"
+                    (Default - "bs4")
+                    "lxml" gives the same words as "bs4" and is faster.
+    :param shard_size: If greater than 0, the filters are written in groups of shard_size documents
+                       to JSON files next to the output file (see get_shard_dir) instead of being
+                       inlined in it. The page fetches them in parallel when searching.
+                       (Default - 0)
+    :param layout: "documents" for one filter per document, or "bitsliced" to group documents under
+                   a shared m and k and store their counters bit-sliced across documents, so that a
+                   query hashes each word once per group (see sthir.bit_sliced).
+                   The bit-sliced layout is always rebuilt in full and inlined in the output file.
+                   (Default - "documents")
+    :param counter_format: "fixed" stores every counter on chunk_size bits, "elias" stores
+                           counter + 1 as an Elias gamma code with a block offset index for
+                           random access, so the many 0 and 1 counters take 1 and 3 bits.
+                           chunk_size still caps the counters. Only for the "documents" layout.
+                           (Default - "fixed")
+    :param compress: Store the filters as gzip compressed bytes instead of base2p15 text, in the
+                     shards or inlined in the output file (see compress_documents). The page
+                     decompresses them with the browser's DecompressionStream.
+                     Only for the "documents" layout.
+                     (Default - False)
+    :param index_file: If given, also writes the filters to this binary index file, which
+                       sthir.search_index.SearchIndex queries from Python.
+                       Only for the "documents" layout.
+                       (Default - None)
+    :param max_bytes: If given, the most bytes a document's filter may take at chunk_size bits
+                      per counter. Larger filters get fewer counters, and a higher false
+                      positive rate, to fit (see sthir.sizing.choose).
+                      Only for the "documents" layout.
+                      (Default - None)
+    :param total_bytes: If given, the most bytes all the filters together may take at chunk_size
+                        bits per counter. Every file is tokenized once more beforehand (only the
+                        edited ones on incremental builds) to spread the bytes over the documents,
+                        minimizing the sum of their false positive rates (see sthir.sizing.allocate).
+                        Large documents give up accuracy first, no filter is larger than
+                        false_positive asks for.
+                        Cannot be combined with max_bytes. Only for the "documents" layout.
+                        (Default - None)
+    :param prefix_length: If greater than 0, every document also gets a filter of the prefixes of
+                          parse.PREFIX_MIN_LENGTH to prefix_length characters of its words, so that
+                          a query word ending in "*" (e.g. "filt*") matches the words starting with it.
+                          The size of both filters of every document is printed.
+                          Budgets do not include the prefix filters. Only for the "documents" layout.
+                          (Default - 0)
+    :param prefix_false_positive: False positive rate of the prefix filters
+                                  (Default - None, the same as false_positive)
+    :param df_sketch: Also write a count-min sketch of the document frequencies of the words
+                      (see sthir.df_sketch), every file is tokenized once more to build it
+                      (only the edited ones on incremental builds).
+                      The page then takes the IDF of a query word from the sketch instead of
+                      probing the filters of all the documents for it.
+                      (Default - False)
+    :param df_sketch_error: Error target of the sketch, which has ceil(e / df_sketch_error) counters
+                            per row whatever the vocabulary (see sthir.df_sketch.sketch_shape).
+                            Lower is more accurate and larger.
+                            (Default - sthir.df_sketch.EPSILON)
 
     It saves the search file in the output_file path.
     """
     files = get_all_html_files(directory)
-    bloom_meta = list()
-    for file in files:
-        bloom_meta.append(
-            generate_bloom_filter(file,
+    sketch = None
+    if layout == "bitsliced":
+        if shard_size > 0:
+            raise ValueError("The bit-sliced layout cannot be sharded")
+        if counter_format != "fixed":
+            raise ValueError("The bit-sliced layout only stores fixed width counters")
+        if compress:
+            raise ValueError("The bit-sliced layout cannot be compressed")
+        if index_file:
+            raise ValueError("The bit-sliced layout cannot be written to an index file")
+        if max_bytes is not None or total_bytes is not None:
+            raise ValueError("The bit-sliced layout cannot have a byte budget")
+        if prefix_length > 0:
+            raise ValueError("The bit-sliced layout has no prefix filters")
+        if df_sketch:
+            sketch = create_df_sketch(files,
+                                      remove_stopwords=remove_stopwords,
+                                      jobs=jobs,
+                                      enable_lemmetization=enable_lemmetization,
+                                      backend=backend,
+                                      epsilon=df_sketch_error)
+        groups, documents = create_bitsliced_index(files,
+                                                   false_positive=false_positive,
+                                                   chunk_size=chunk_size,
+                                                   remove_stopwords=remove_stopwords,
+                                                   hashing=hashing,
+                                                   jobs=jobs,
+                                                   enable_lemmetization=enable_lemmetization,
+                                                   backend=backend)
+        with open(output_file, "w", encoding='utf8') as f:
+            f.write(convert_2p15.HTML_TEMPLATE["HEAD"])
+            if sketch is not None:
+                f.write(convert_2p15.HTML_TEMPLATE["DF_SKETCH"].format(sketch))
+            f.write(convert_2p15.HTML_TEMPLATE["TAIL_BITSLICED"].format(groups, documents))
+        return
+    if layout != "documents":
+        raise ValueError(f"Unknown layout {layout!r}, expected 'documents' or 'bitsliced'")
+    if max_bytes is not None and total_bytes is not None:
+        raise ValueError("Give either max_bytes or total_bytes, not both")
+    params = {
+        "false_positive": false_positive,
+        "chunk_size": chunk_size,
+        "remove_stopwords": remove_stopwords,
+        "enable_lemmetization": enable_lemmetization,
+        "hashing": hashing,
+        "backend": backend,
+        "counter_format": counter_format,
+        "max_bytes": max_bytes,
+        "prefix_length": prefix_length,
+        "prefix_false_positive": prefix_false_positive,
+    }
+
+    manifest_file = get_manifest_path(output_file)
+    cached = load_manifest(manifest_file) if incremental else {}
+    hashes = {file: hash_file(file) for file in files} if incremental else {}
+    # Files whose tokens are the same as in the manifest
+    same_tokens = [
+        file for file in files if file in cached and cached[file]["hash"] == hashes.get(file)
+        and all(cached[file]["params"].get(key) == params[key] for key in TOKEN_PARAMS)
+    ]
+
+    # Build parameters of every file, they only differ by their share of total_bytes
+    file_params = {file: params for file in files}
+    unique_counts = {}
+    if total_bytes is not None:
+        unique_counts = {
+            file: cached[file]["no_unique_items"]
+            for file in same_tokens if "no_unique_items" in cached[file]
+        }
+        budgets = allocate_budget(files,
+                                  total_bytes,
                                   false_positive=false_positive,
                                   chunk_size=chunk_size,
-                                  remove_stopwords=remove_stopwords))
+                                  remove_stopwords=remove_stopwords,
+                                  jobs=jobs,
+                                  enable_lemmetization=enable_lemmetization,
+                                  backend=backend,
+                                  unique_counts=unique_counts)
+        file_params = {file: dict(params, max_bytes=budget) for file, budget in zip(files, budgets)}
+    vocabularies = {}
+    if df_sketch:
+        # Prefixes are part of the vocabularies
+        vocabularies = {
+            file: cached[file]["vocabulary"]
+            for file in same_tokens
+            if "vocabulary" in cached[file] and cached[file]["params"].get("prefix_length") == prefix_length
+        }
+        sketch = create_df_sketch(files,
+                                  remove_stopwords=remove_stopwords,
+                                  jobs=jobs,
+                                  enable_lemmetization=enable_lemmetization,
+                                  backend=backend,
+                                  prefix_length=prefix_length,
+                                  vocabularies=vocabularies,
+                                  epsilon=df_sketch_error)
+    stale = [
+        file for file in files
+        if file not in cached or cached[file]["hash"] != hashes.get(file)
+        or cached[file]["params"] != file_params[file]
+    ]
+
+    if jobs > 1 and len(stale) > 1:
+        # Results are collected in submission order, so the page does not
+        # depend on which worker finishes first
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(scan_document, file, **file_params[file]) for file in stale]
+            built = {file: future.result() for file, future in zip(stale, futures)}
+    else:
+        built = {file: scan_document(file, **file_params[file]) for file in stale}
 
     base2p15_arrs = list()
-    for document in bloom_meta:
-        bit_arr = bitarray()
-        with open(document["bin_file"], "rb") as f:
-            bit_arr.fromfile(f)
-
-        base2p15_arrs.append([
-            base2p15_encode(bit_arr.to01()), document["chunk_size"],
-            document["m"], document["k"], document["bin_file"],
-            document["title"], document["no_items"]
-        ])
-        print("Scanned: {}".format(document["bin_file"]))
+    total_sizes = [0, 0]
+    for file in files:
+        if file in built:
+            base2p15_arrs.append(built[file])
+            message = "Scanned: {}".format(built[file][4])
+        else:
+            base2p15_arrs.append(cached[file]["entry"])
+            message = "Unchanged: {}".format(file)
+        if prefix_length > 0:
+            sizes = get_entry_sizes(base2p15_arrs[-1])
+            total_sizes = [total + size for total, size in zip(total_sizes, sizes)]
+            message += " (filter: {} bytes, prefix filter: {} bytes)".format(*sizes)
+        print(message)
+    if prefix_length > 0:
+        print("Prefix filters: {1} bytes, {2:+.1%} over the {0} bytes of the word filters".format(
+            total_sizes[0], total_sizes[1], total_sizes[1] / max(total_sizes[0], 1)))
+
+    if incremental:
+        # Files no longer in the directory are dropped from the manifest,
+        # the unique tokens counted for total_bytes and vocabularies read for
+        # the sketch are kept for the next build
+        documents = dict()
+        for file, entry in zip(files, base2p15_arrs):
+            documents[file] = {"hash": hashes[file], "params": file_params[file], "entry": entry}
+            if file in unique_counts:
+                documents[file]["no_unique_items"] = unique_counts[file]
+            if file in vocabularies:
+                documents[file]["vocabulary"] = vocabularies[file]
+        save_manifest(manifest_file, documents)
+
+    if index_file:
+        search_index.write_index(base2p15_arrs, index_file)
 
     with open(output_file, "w", encoding='utf8') as f:
         f.write(convert_2p15.HTML_TEMPLATE["HEAD"])
-        f.write(convert_2p15.HTML_TEMPLATE["TAIL"].format(base2p15_arrs))
+        if sketch is not None:
+            f.write(convert_2p15.HTML_TEMPLATE["DF_SKETCH"].format(sketch))
+        if shard_size > 0:
+            manifest = write_shards(base2p15_arrs, output_file, shard_size, compress)
+            f.write(convert_2p15.HTML_TEMPLATE["TAIL_SHARDED"].format(json.dumps(manifest)))
+        elif compress:
+            manifest = inline_compressed(base2p15_arrs)
+            f.write(convert_2p15.HTML_TEMPLATE["TAIL_SHARDED"].format(json.dumps(manifest)))
+        else:
+            f.write(convert_2p15.HTML_TEMPLATE["TAIL"].format(base2p15_arrs))
 
 
 def download_urls(json_file, output_file=""):
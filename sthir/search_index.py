@@ -0,0 +1,190 @@
+"""
+Binary index file holding the filters of many documents, queried from Python.
+
+The .bin files written by create_filter only hold counters, m, k, chunk_size and
+no_items live in the search page. An index file is self-describing:
+
+* header: magic ``b"STHIRIDX"``, format version, number of documents and the
+  offset of the string table (little-endian, see HEADER)
+* offset table: one RECORD per document - offset and length of its counters,
+  m, k, chunk_size, hashing scheme and no_items
+* the counters of every document, chunk_size bits each (as pack_counters),
+  followed by PADDING zero bytes
+* string table: UTF-8 JSON list of [title, url] of every document
+
+SearchIndex memory-maps the file, so a query only reads the counters it hashes to.
+"""
+import heapq
+import json
+import mmap
+import struct
+from math import ceil
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from sthir.generate_search import base2p15_decode_bytes
+from sthir.mmh3 import murmur3_x86_32_batch
+from sthir.spectral_bloom_filter import HASHING_SCHEMES, pack_counters
+from sthir.variable_counters import gamma_decode
+
+MAGIC = b"STHIRIDX"
+VERSION = 1
+# magic, version, reserved, documents, string table offset
+HEADER = struct.Struct("<8sHHIQ")
+# offset, length, m, k, chunk_size, hashing (index in HASHING_SCHEMES), reserved, no_items
+RECORD = np.dtype([("offset", "<u8"), ("length", "<u8"), ("m", "<u4"), ("k", "<u4"),
+                   ("chunk_size", "<u2"), ("hashing", "u1"), ("reserved", "u1"),
+                   ("no_items", "<u8")])
+# Counters are read 4 bytes at a time, which never crosses into the next filter
+PADDING = 3
+
+
+def entry_counters_bytes(entry: list) -> bytes:
+    """
+    Returns the counters of a documents array entry (see scan.scan_document)
+    packed chunk_size bits each, gamma coded filters are re-packed
+    """
+    data = base2p15_decode_bytes(entry[0]).tobytes()
+    chunk_size, m = entry[1], entry[2]
+    if len(entry) > 8 and entry[8][0] == "elias":
+        return pack_counters(gamma_decode(data, m).astype(np.uint32), chunk_size)
+    return data[:ceil(m * chunk_size / 8)]
+
+
+def write_index(base2p15_arrs: Sequence[list], path: str) -> None:
+    """
+    Writes the documents array entries of a search page to an index file
+
+    :param base2p15_arrs: Entries as returned by scan.scan_document
+    :param path: Path of the index file
+    """
+    filters = [entry_counters_bytes(entry) for entry in base2p15_arrs]
+    records = np.zeros(len(base2p15_arrs), dtype=RECORD)
+    offset = HEADER.size + records.nbytes
+    for record, entry, data in zip(records, base2p15_arrs, filters):
+        record["offset"], record["length"] = offset, len(data)
+        record["m"], record["k"], record["chunk_size"] = entry[2], entry[3], entry[1]
+        record["hashing"] = HASHING_SCHEMES.index(entry[7] if len(entry) > 7 else "standard")
+        record["no_items"] = entry[6]
+        offset += len(data) + PADDING
+
+    strings = json.dumps([[entry[5], entry[4].replace(".bin", ".html")] for entry in base2p15_arrs],
+                         ensure_ascii=False).encode("utf8")
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(base2p15_arrs), offset))
+        f.write(records.tobytes())
+        for data in filters:
+            f.write(data + bytes(PADDING))
+        f.write(strings)
+
+
+class SearchIndex:
+    """
+    Ranked search over an index file written by write_index,
+    scored like get_all_scores in the generated search page.
+
+    Example
+    --------
+        >>> with SearchIndex("search.idx") as index:
+        ...     index.search("spectral bloom")
+        [(0.0123, 'Spectral Bloom Filters', 'docs/sbf.html'), ...]
+    """
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, documents, strings_offset = HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path!r} is not a sthir index file")
+        if version != VERSION:
+            raise ValueError(f"Unsupported index version {version} in {path!r}")
+        self.data = np.frombuffer(self.mmap, dtype=np.uint8)
+        self.records = np.frombuffer(self.mmap, dtype=RECORD, count=documents, offset=HEADER.size)
+        strings = json.loads(self.mmap[strings_offset:].decode("utf8"))
+        self.titles = [title for title, _ in strings]
+        self.urls = [url for _, url in strings]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def close(self) -> None:
+        # Views of the map must be released before closing it
+        self.data = self.records = None
+        self.mmap.close()
+
+    def read_counters(self, doc: int, indices: np.ndarray) -> np.ndarray:
+        """
+        Reads the counters at the given indices of a document, without decoding the filter
+        """
+        record = self.records[doc]
+        chunk_size = int(record["chunk_size"])
+        positions = indices.astype(np.int64) * chunk_size
+        first = int(record["offset"]) + (positions >> 3)
+        word = np.zeros(positions.shape, dtype=np.uint32)
+        for i in range(4):
+            word = (word << np.uint32(8)) | self.data[first + i]
+        shift = (32 - chunk_size - (positions & 7)).astype(np.uint32)
+        return (word >> shift) & np.uint32((1 << chunk_size) - 1)
+
+    def counters(self, doc: int) -> np.ndarray:
+        """
+        Returns all the counters of a document
+        """
+        return self.read_counters(doc, np.arange(int(self.records[doc]["m"])))
+
+    def tf_scores(self, words: Sequence[str]) -> np.ndarray:
+        """
+        Term frequencies of the words in every document, shape (documents, words).
+        As bitArray.get_document_score, the score of word i is the sum of the
+        minimum counters of words 0..i over no_items.
+        """
+        scores = np.zeros((len(self), len(words)))
+        if not len(self) or not len(words):
+            return scores
+        k_max = int(self.records["k"].max())
+        hashes = murmur3_x86_32_batch(list(words), range(max(k_max, 2))).astype(np.uint64)
+        for doc, record in enumerate(self.records):
+            m, k = np.uint64(record["m"]), int(record["k"])
+            if HASHING_SCHEMES[record["hashing"]] == "double":
+                indices = (hashes[:, :1] + np.arange(k, dtype=np.uint64) * hashes[:, 1:2]) % m
+            else:
+                indices = hashes[:, :k] % m
+            minimum = self.read_counters(doc, indices).min(axis=1)
+            if record["no_items"]:
+                scores[doc] = np.cumsum(minimum / float(record["no_items"]))
+        return scores
+
+    def query(self, words: Sequence[str], limit: Optional[int] = None) -> List[Tuple[float, str, str]]:
+        """
+        Ranks the documents for the words with TF-IDF, as get_all_scores
+
+        :param limit: If given, only the limit best documents are returned
+        :returns: (score, title, url) of the documents with a positive score, best first
+        """
+        tf = self.tf_scores(words)
+        doc_words = (tf > 0).sum(axis=0)
+        scores = np.ones(len(self))
+        # Words absent from every document give 0 * inf = nan, never a positive score
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for word in range(len(words)):
+                scores *= tf[:, word] * np.log10(len(self) / doc_words[word])
+        ranked = [(float(scores[doc]), self.titles[doc], self.urls[doc])
+                  for doc in range(len(self)) if scores[doc] > 0]
+        # Stable, as Array.prototype.sort
+        if limit is not None:
+            return heapq.nsmallest(limit, ranked, key=lambda result: -result[0])
+        return sorted(ranked, key=lambda result: -result[0])
+
+    def search(self, text: Union[str, Sequence[str]], limit: Optional[int] = None) -> List[Tuple[float, str, str]]:
+        """
+        Ranks the documents for a query typed in the search page
+        (lowercased, split on spaces, without empty words), see query
+        """
+        words = [word for word in text.lower().split(" ") if word] if isinstance(text, str) else list(text)
+        return self.query(words, limit) if words else []
@@ -0,0 +1,118 @@
+"""
+Sizing of Spectral Bloom Filters.
+
+A filter of m counters and k hashes holding n unique words answers a word it
+has never seen with a false positive about (1 - e^(-kn/m))^k of the time, as a
+Bloom filter of m bits would. Every counter takes chunk_size bits though, so the
+payload of the filter is m * chunk_size / 8 bytes. choose picks m and k for a
+false positive rate and, given a byte budget, shrinks m to fit it and re-derives
+k for the smaller m. allocate spreads a budget over the filters of a whole site.
+
+Results are memoized, documents of a corpus often share their vocabulary size.
+"""
+from collections import namedtuple
+from functools import lru_cache
+from math import ceil, exp, log
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# m counters, k hashes, bytes of the fixed width counters and expected false positive rate
+FilterSize = namedtuple("FilterSize", ["m", "k", "bytes", "false_positive"])
+
+
+@lru_cache(maxsize=4096)
+def optimal_m_k(n: int, p: float) -> Tuple[int, int]:
+    """
+    From: https://stackoverflow.com/questions/658439/how-many-hash-functions-does-my-bloom-filter-need
+
+    :param n: Unique items expected in the filter, an empty filter is sized for one
+    :param p: False positive rate
+    :returns: m counters and k hash functions
+    """
+    n = max(n, 1)
+    m = -n * log(p) / (log(2)**2)
+    k = (m / n) * log(2)
+    return ceil(m), max(round(k), 1)
+
+
+def optimal_k(n: int, m: int) -> int:
+    """
+    Number of hash functions minimizing the false positive rate of m counters holding n items
+    """
+    return max(round(m / max(n, 1) * log(2)), 1)
+
+
+def false_positive_rate(n: int, m: int, k: int) -> float:
+    """
+    Expected false positive rate of m counters and k hashes holding n items
+    """
+    return (1 - exp(-k * n / m))**k
+
+
+def filter_bytes(m: int, chunk_size: int) -> int:
+    """
+    Bytes of m counters of chunk_size bits, as written by pack_counters
+    """
+    return ceil(m * chunk_size / 8)
+
+
+@lru_cache(maxsize=4096)
+def choose(n: int, p: float, chunk_size: int = 4, max_bytes: Optional[int] = None) -> FilterSize:
+    """
+    Sizes the filter of n unique items
+
+    :param n: Unique items in the filter
+    :param p: False positive rate
+    :param chunk_size: Bits per counter
+    :param max_bytes: If given, the largest filter in bytes (chunk_size bits per counter).
+                      A filter over the budget gets fewer counters and a higher false positive rate.
+    :returns: FilterSize of the filter
+    """
+    if max_bytes is not None and max_bytes < 1:
+        raise ValueError(f"max_bytes has to be at least 1, got {max_bytes}")
+    m, k = optimal_m_k(n, p)
+    if max_bytes is not None and filter_bytes(m, chunk_size) > max_bytes:
+        m = max(max_bytes * 8 // chunk_size, 1)
+        k = optimal_k(n, m)
+    return FilterSize(m, k, filter_bytes(m, chunk_size), false_positive_rate(max(n, 1), m, k))
+
+
+def allocate(unique_counts: Sequence[int], total_bytes: int, p: float, chunk_size: int = 4) -> List[FilterSize]:
+    """
+    Spreads a byte budget over the filters of many documents, minimizing the sum
+    of their false positive rates (the expected number of documents a missing word matches).
+
+    With the optimal k the rate of a filter is about exp(-(m / n) ln(2)^2), all filters
+    gain as much from one more counter when the rate of each is proportional to its n.
+    The factor is found by bisection, no filter gets a lower rate (more counters) than p
+    and every filter gets at least a byte.
+
+    :param unique_counts: Unique items of every filter
+    :param total_bytes: Bytes of all the filters together (chunk_size bits per counter)
+    :param p: False positive rate of the filters when the budget is large enough
+    :param chunk_size: Bits per counter
+    :returns: FilterSize of every filter, together at most total_bytes
+    """
+    n = np.maximum(np.asarray(unique_counts, dtype=np.float64), 1)
+    if total_bytes < len(n):
+        raise ValueError(f"total_bytes has to be at least 1 per filter, {len(n)} bytes for {len(n)} filters")
+
+    def sizes(scale: float) -> np.ndarray:
+        rates = np.clip(scale * n, p, 1)
+        m = np.ceil(-n * np.log(rates) / (log(2)**2))
+        return np.maximum(np.ceil(m * chunk_size / 8), 1)
+
+    # Within the budget every filter keeps the size p asks for
+    budgets = sizes(0)
+    if budgets.sum() > total_bytes:
+        # log(scale) between all the rates at p and all at 1, where every filter takes a byte
+        low, high = log(p / n.max()), log(1 / n.min())
+        for _ in range(64):
+            middle = (low + high) / 2
+            if sizes(exp(middle)).sum() > total_bytes:
+                low = middle
+            else:
+                high = middle
+        budgets = sizes(exp(high))
+    return [choose(int(count), p, chunk_size, int(budget)) for count, budget in zip(unique_counts, budgets)]
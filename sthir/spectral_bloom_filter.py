@@ -1,22 +1,129 @@
 from itertools import product
-from math import ceil, log
-from typing import Counter, Iterable, List
+from typing import Counter, Iterable, List, Optional
 
-from bitarray import bitarray
+import numpy as np
 
 from sthir.mmh3 import murmur3_x86_32 as mmh3_hash
+from sthir.mmh3 import murmur3_x86_32_batch as mmh3_hash_batch
+import sthir.sizing as sizing
+from sthir.variable_counters import gamma_encode
+
+# "standard": k murmur hashes with seeds 0..k-1
+# "double": Kirsch-Mitzenmacher, index i is (h(0) + i * h(1)) % m
+HASHING_SCHEMES = ("standard", "double")
+
+# _minimum_increment inserts the remaining rows one by one once fewer than
+# 1 / SEQUENTIAL_RATIO of them are ready for a batch
+SEQUENTIAL_RATIO = 8
+
+# "fixed": chunk_size bits per counter
+# "elias": Elias gamma code of counter + 1 (see sthir.variable_counters)
+COUNTER_FORMATS = ("fixed", "elias")
+
+
+def counter_dtype(chunk_size: int) -> np.dtype:
+    """
+    Smallest unsigned integer dtype which can hold a chunk_size bit counter
+    """
+    if chunk_size <= 8:
+        return np.dtype(np.uint8)
+    if chunk_size <= 16:
+        return np.dtype(np.uint16)
+    return np.dtype(np.uint32)
+
+
+def pack_counters(counters: np.ndarray, chunk_size: int) -> bytes:
+    """
+    Packs counters into a big-endian bit stream of chunk_size bits each,
+    the same layout (and zero padding up to a byte) as
+    ``bitarray("".join(bin(c)[2:].zfill(chunk_size) ...)).tobytes()``.
+
+    :param counters: Array of counters, every value < 2**chunk_size
+    :param chunk_size: Bits per counter
+    :returns: The packed bytes
+    """
+    shifts = np.arange(chunk_size - 1, -1, -1, dtype=counters.dtype)
+    # Blocks of a multiple of 8 counters always end on a byte boundary
+    block = 8 * 8192
+    return b"".join(
+        np.packbits(((counters[i:i + block, None] >> shifts) & 1).astype(np.uint8)).tobytes()
+        for i in range(0, len(counters), block))
+
+
+def _minimum_increment(sbf: np.ndarray, indices: np.ndarray,
+                       frequencies: np.ndarray, upper_bound: int) -> None:
+    """
+    Applies the Minimum Increase insertion of the SBF paper for every row of
+    indices, in order, updating sbf in place.
+
+    Rows are applied in batches: a row is ready once no earlier pending row
+    shares a counter with it, so all ready rows touch disjoint counters and
+    can be applied together with the same result as inserting one by one.
+    Every batch costs a pass over the pending rows, so once few of them are
+    ready (m small next to the number of rows), the rest are inserted one by one.
+    """
+    pending = np.arange(len(indices))
+    while pending.size:
+        rows = indices[pending]
+        flat = rows.ravel()
+        _, first, inverse = np.unique(flat, return_index=True, return_inverse=True)
+        owner = (first[inverse.ravel()] // rows.shape[1]).reshape(rows.shape)
+        ready = (owner == np.arange(len(pending))[:, None]).all(axis=1)
+        if np.count_nonzero(ready) < len(pending) // SEQUENTIAL_RATIO:
+            _sequential_increment(sbf, rows, frequencies[pending], upper_bound)
+            return
+
+        batch = rows[ready]
+        current = sbf[batch].astype(np.int64)
+        mn = current.min(axis=1)
+        updated = np.minimum(mn + frequencies[pending[ready]], upper_bound)
+        hit = current == mn[:, None]
+        sbf[batch[hit]] = np.broadcast_to(updated[:, None], batch.shape)[hit]
+
+        pending = pending[~ready]
+
+
+def _sequential_increment(sbf: np.ndarray, indices: np.ndarray,
+                          frequencies: np.ndarray, upper_bound: int) -> None:
+    """
+    Minimum Increase insertion of every row of indices, one row after the other
+    """
+    counters = sbf.tolist()
+    for row, frequency in zip(indices.tolist(), frequencies.tolist()):
+        smallest = min(counters[i] for i in row)
+        updated = min(smallest + frequency, upper_bound)
+        for i in row:
+            if counters[i] == smallest:
+                counters[i] = updated
+    sbf[:] = counters
+
+
+def _check_scheme(scheme: str) -> None:
+    if scheme not in HASHING_SCHEMES:
+        raise ValueError(
+            f"Unknown hashing scheme {scheme!r}, expected one of {HASHING_SCHEMES}")
+
+
+def _check_format(counter_format: str) -> None:
+    if counter_format not in COUNTER_FORMATS:
+        raise ValueError(
+            f"Unknown counter format {counter_format!r}, expected one of {COUNTER_FORMATS}")
 
 
 class Hash_Funcs:
     """Class which creates the hash functions required for the Spectral Bloom filters."""
-    def __init__(self, k: int, m: int):
+    def __init__(self, k: int, m: int, scheme: str = "standard"):
         """
         Creates hash functions given m and k
 
         :param m: size of counter array
         :param k: number of hash functions
+        :param scheme: one of HASHING_SCHEMES (default: "standard")
         """
+        _check_scheme(scheme)
         self.k = k
+        self.m = m
+        self.scheme = scheme
         self.hash_funcs_list = []
         for _ in range(self.k):
             self.hash_funcs_list.append(lambda x, s: mmh3_hash(x, seed=s) % m)
@@ -28,6 +135,9 @@ class Hash_Funcs:
         :param word: Word to be hashed
         :returns: List of hashes of the word
         """
+        if self.scheme == "double":
+            h1, h2 = mmh3_hash(word, seed=0), mmh3_hash(word, seed=1)
+            return [(h1 + i * h2) % self.m for i in range(self.k)]
         return [self.hash_funcs_list[i](word, i) for i in range(self.k)]
 
     def check_hashes(self, word_list: list):
@@ -59,74 +169,167 @@ class Spectral_Bloom_Filter:
     |  Paper: SIGMOD '03: Proceedings of the 2003 ACM SIGMOD international conference on Management of data, June 2003 Pages 241–252
     |  DOI: https://doi.org/10.1145/872757.872787
     """
-    def create_hashes(self, token: str, hashes: int, max_length: int) -> list:
+    def create_hashes(self, token: str, hashes: int, max_length: int,
+                      scheme: str = "standard") -> list:
         """
         Get the hased indices for the string
 
         :param token: token to index
         :param hashes: no. of hashes (k)
         :param max_length: maximum length of the hash (m)
+        :param scheme: one of HASHING_SCHEMES (default: "standard")
         :returns: list of hashes
         """
+        _check_scheme(scheme)
+        if scheme == "double":
+            h1, h2 = mmh3_hash(key=token, seed=0), mmh3_hash(key=token, seed=1)
+            return [(h1 + i * h2) % max_length for i in range(hashes)]
         return [
             mmh3_hash(key=token, seed=index) % max_length
             for index in range(hashes)
         ]
 
+    def create_hashes_batch(self, tokens: List[str], hashes: int,
+                            max_length: int,
+                            scheme: str = "standard") -> np.ndarray:
+        """
+        Get the hashed indices for a whole vocabulary at once
+
+        :param tokens: tokens to index
+        :param hashes: no. of hashes (k)
+        :param max_length: maximum length of the hash (m)
+        :param scheme: one of HASHING_SCHEMES (default: "standard")
+        :returns: matrix of shape (len(tokens), hashes), row i holds
+                  create_hashes(tokens[i], hashes, max_length, scheme)
+        """
+        _check_scheme(scheme)
+        if scheme == "double":
+            base = mmh3_hash_batch(tokens, range(2)).astype(np.uint64)
+            steps = np.arange(hashes, dtype=np.uint64)
+            indices = base[:, :1] + steps * base[:, 1:]
+            return (indices % np.uint64(max_length)).astype(np.uint32)
+        return mmh3_hash_batch(tokens, range(hashes)) % np.uint32(max_length)
+
+    def create_counters(self,
+                        token_frq: Counter,
+                        m: int,
+                        k: int,
+                        chunk_size: int = 4,
+                        hashing: str = "standard") -> np.ndarray:
+        """
+        Inserts counted tokens in a new counter array of a given size with Minimum Increase.
+
+        :param token_frq: Frequency of every token
+        :param m: Number of counters
+        :param k: Number of hash functions
+        :param chunk_size: Size of each counter in bits (default: 4)
+        :param hashing: One of HASHING_SCHEMES (default: "standard")
+        :returns: Array of m counters (uint8, or uint16 for chunk_size > 8)
+        """
+        upper_bound = 2**chunk_size - 1
+        sbf = np.zeros(m, dtype=counter_dtype(chunk_size))
+        words = list(token_frq)
+        all_indices = self.create_hashes_batch(tokens=words,
+                                               hashes=k,
+                                               max_length=m,
+                                               scheme=hashing)
+        frequencies = np.fromiter(token_frq.values(), dtype=np.int64, count=len(words))
+        _minimum_increment(sbf, all_indices, frequencies, upper_bound)
+        return sbf
+
     def create_filter(self,
-                      tokens: list,
+                      tokens: Iterable[str],
                       p:float,
                       chunk_size: int = 4,
                       to_bitarray: bool = True,
-                      bitarray_path: str = "document.bin") -> List[str]:
+                      bitarray_path: str = "document.bin",
+                      hashing: str = "standard",
+                      counter_format: str = "fixed",
+                      max_bytes: Optional[int] = None) -> np.ndarray:
         """
         Creates a spectral bloom filter.
 
         |  Paper:  SIGMOD '03: Proceedings of the 2003 ACM SIGMOD international conference on Management of data, June 2003 Pages 241–252
         |  DOI: https://doi.org/10.1145/872757.872787
 
-        :param tokens: List of words to index in spectral bloom filter
+        :param tokens: Words to index in spectral bloom filter, any iterable.
+                       A generator (e.g. sthir.parse.iter_html_bs4) is consumed
+                       straight into a running count.
         :param p: The false postive rate
         :param chunk_size: Size of each counter in Spectral Bloom Filter (default: 4).
                            Default of 4 means that the maximum increment a counter.
                            Can perform is 2**4, which is 16.
-        :param to_bitarray: If True, will convert and save as bitarray in bitarray_path.
-                            If False, method will return list of lists containing 
-                            the entire bitarray with chunks.
+        :param to_bitarray: If True, will pack the counters bitarray style and save
+                            them in bitarray_path, chunk_size bits per counter.
                             (Default: True).
         :param bitarray_path: Path to store the bitarray, (default:"document.bin").
-        :returns: An array of binary strings
+        :param hashing: How the k indices are derived, one of HASHING_SCHEMES.
+                        "double" needs only two murmur hashes per token
+                        (default: "standard").
+        :param counter_format: How the counters are saved in bitarray_path, one of
+                               COUNTER_FORMATS. "elias" gives small counters
+                               fewer bits, chunk_size still caps their value
+                               (default: "fixed").
+        :param max_bytes: If given, m is reduced so that the counters take at most
+                          max_bytes at chunk_size bits each, see sthir.sizing.choose
+                          (default: None).
+        :returns: Array of m counters (uint8, or uint16 for chunk_size > 8)
+
+        The total number of tokens inserted is kept in ``self.no_items``
+        and the number of unique tokens in ``self.no_unique_items``.
+        The filter (``self.counters``, ``self.m``, ``self.k``, ``self.chunk_size``
+        and ``self.hashing``) is kept for query and query_many.
         """
+        _check_format(counter_format)
         token_frq = Counter(tokens)
-        upper_bound = 2**chunk_size - 1
-        m,k = self.optimal_m_k(len(token_frq),p)
-        sbf = [0] * m
-        for word, frequency in token_frq.items():
-            hash_indices = self.create_hashes(token=word,
-                                              hashes=k,
-                                              max_length=m)
-            mn = min(map(sbf.__getitem__, hash_indices))
-            for i in hash_indices:
-                if sbf[i] == mn:
-                    sbf[i] = min(sbf[i] + frequency, upper_bound)
-        sbf = map(lambda x: bin(x)[2:].zfill(chunk_size), sbf)
+        self.no_items = sum(token_frq.values())
+        self.no_unique_items = len(token_frq)
+        m, k = sizing.choose(len(token_frq), p, chunk_size, max_bytes)[:2]
+        sbf = self.create_counters(token_frq, m, k, chunk_size, hashing)
+        self.counters, self.m, self.k = sbf, m, k
+        self.chunk_size, self.hashing = chunk_size, hashing
         if to_bitarray == True:
-            arr = bitarray("".join(sbf))
-            arr.tofile(open(bitarray_path, 'wb'))
-        return list(sbf)
+            with open(bitarray_path, 'wb') as f:
+                if counter_format == "elias":
+                    f.write(gamma_encode(sbf)[0])
+                else:
+                    f.write(pack_counters(sbf, chunk_size))
+        return sbf
+
+    def query_many(self, words: Iterable[str]) -> np.ndarray:
+        """
+        Estimates the frequency of many words in the filter built by create_filter.
+        All the words are hashed together and their k counters gathered at once.
+
+        :param words: Words to look up
+        :returns: Array with the smallest of the k counters of every word
+        """
+        if getattr(self, "counters", None) is None:
+            raise ValueError("No filter to query, call create_filter first")
+        words = list(words)
+        if not words:
+            return np.zeros(0, dtype=self.counters.dtype)
+        indices = self.create_hashes_batch(tokens=words,
+                                           hashes=self.k,
+                                           max_length=self.m,
+                                           scheme=self.hashing)
+        return self.counters[indices].min(axis=1)
+
+    def query(self, word: str) -> int:
+        """
+        Estimates the frequency of a word in the filter built by create_filter
+        """
+        return int(self.query_many([word])[0])
 
-    def optimal_m_k(self, n: int, p: int) -> tuple:
+    def optimal_m_k(self, n: int, p: float) -> tuple:
         """
-        From: https://stackoverflow.com/questions/658439/how-many-hash-functions-does-my-bloom-filter-need
+        See sthir.sizing.optimal_m_k
 
-        :param n: items expected in filter
+        :param n: unique items expected in filter
         :param p: false positive rate
-        :param chunk_size: number of bits in each counter
 
         :returns: Tuple containing: 
-                 m for number of bits needed in the bloom filter (index 0) and
+                 m for number of counters needed in the bloom filter (index 0) and
                  k for number of hash functions we should apply (index 1)
         """
-        m = (-n * log(p) / (log(2)**2))
-        k = (m / n) * log(2)
-        return (ceil(m), round(k))
+        return sizing.optimal_m_k(n, p)
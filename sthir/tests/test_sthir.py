@@ -1,5 +1,28 @@
+import gzip
+import io
+import json
+import os
+import tempfile
 import unittest
-from sthir.spectral_bloom_filter import Hash_Funcs , Spectral_Bloom_Filter
+from collections import Counter
+from contextlib import redirect_stdout
+from math import ceil
+
+import numpy as np
+from bitarray import bitarray
+
+from sthir.accuracy import Config , evaluate , get_checkpoint_path , grid , run
+from sthir.bit_sliced import bit_slice , build_groups , group_documents
+from sthir.df_sketch import build_sketch , encode_sketch , estimate , sketch_shape , vocabulary
+from sthir.mmh3 import murmur3_x86_32 , murmur3_x86_32_batch
+from sthir.parse import extract_html_bs4 , extract_html_lxml , parse_html
+from sthir.parse import pipeline , lowercase , tokenize , drop_stopwords , iter_tokens , get_tokenizer , lemmatize , prefixes
+from sthir.scan import compress_documents , create_search_page , generate_bloom_filter , get_entry_sizes , get_manifest_path , hash_file , load_manifest , save_manifest , scan_document , write_shards
+from sthir.generate_search import base2p15_encode , base2p15_decode , base2p15_encode_bytes , base2p15_decode_bytes
+from sthir.search_index import SearchIndex , write_index
+from sthir.sizing import allocate , choose , false_positive_rate , optimal_k , optimal_m_k
+from sthir.spectral_bloom_filter import Hash_Funcs , Spectral_Bloom_Filter , _minimum_increment , pack_counters
+from sthir.variable_counters import GammaCounters , block_offsets , encode_index , gamma_decode , gamma_encode
 
 
 class Test_Hashing(unittest.TestCase):
@@ -12,6 +35,32 @@ class Test_Hashing(unittest.TestCase):
         k , m = 5 , 100
         hash_obj = Hash_Funcs(k , m)
         self.assertEqual([66, 78, 4, 86, 26],   hash_obj.get_hashes("cats"))
+
+    def test_batch_hashes(self):
+        words = ["", "a", "ab", "abc", "dogs", "cats", "Mrunank", "naïve", "spectral", "日本語", "x" * 5000 + "yz"]
+        matrix = murmur3_x86_32_batch(words, range(4))
+        self.assertEqual(matrix.shape, (len(words), 4))
+        for i, word in enumerate(words):
+            self.assertEqual([murmur3_x86_32(word, s) for s in range(4)], matrix[i].tolist())
+
+    def test_batch_indices(self):
+        SBF = Spectral_Bloom_Filter()
+        self.assertEqual([[133, 193, 69], [166, 78, 4]],
+                         SBF.create_hashes_batch(["dogs", "cats"], 3, 200).tolist())
+
+    def test_double_hashing(self):
+        k , m = 5 , 1000003
+        SBF = Spectral_Bloom_Filter()
+        hash_obj = Hash_Funcs(k , m, scheme="double")
+        h1, h2 = murmur3_x86_32("cats", 0), murmur3_x86_32("cats", 1)
+        expected = [(h1 + i * h2) % m for i in range(k)]
+        self.assertEqual(expected, hash_obj.get_hashes("cats"))
+        self.assertEqual(expected, SBF.create_hashes("cats", k, m, scheme="double"))
+        self.assertEqual([expected], SBF.create_hashes_batch(["cats"], k, m, scheme="double").tolist())
+
+    def test_unknown_scheme(self):
+        with self.assertRaises(ValueError):
+            Hash_Funcs(3, 200, scheme="triple")
     
 
 class Test_SBF(unittest.TestCase):
@@ -22,6 +71,542 @@ class Test_SBF(unittest.TestCase):
         actual = SBF.optimal_m_k(100, 0.1)
         self.assertEqual( expected,  actual )
 
+    def test_minimum_increment(self):
+        SBF = Spectral_Bloom_Filter()
+        tokens = ["dogs"] * 3 + ["cats"] * 20 + ["bloom"]
+        counter = SBF.create_filter(tokens, 0.001, chunk_size=4, to_bitarray=False)
+        self.assertEqual(counter.dtype, np.uint8)
+        m, k = SBF.optimal_m_k(3, 0.001)
+        self.assertEqual(len(counter), m)
+        for word, count in [("dogs", 3), ("cats", 15), ("bloom", 1)]:
+            indices = SBF.create_hashes(word, k, m)
+            self.assertEqual(count, min(int(counter[i]) for i in indices))
+
+    def test_minimum_increment_small_m(self):
+        # Far more rows than counters, inserted one by one past the first batches
+        rng = np.random.default_rng(0)
+        indices = rng.integers(0, 50, (2000, 3))
+        frequencies = rng.integers(1, 4, 2000)
+        expected = np.zeros(50, dtype=np.int64)
+        for row, frequency in zip(indices, frequencies):
+            smallest = expected[row].min()
+            expected[row[expected[row] == smallest]] = min(smallest + frequency, 15)
+        counters = np.zeros(50, dtype=np.uint8)
+        _minimum_increment(counters, indices, frequencies, 15)
+        self.assertEqual( expected.tolist() , counters.tolist() )
+
+    def test_query_many(self):
+        SBF = Spectral_Bloom_Filter()
+        with self.assertRaises(ValueError):
+            SBF.query_many(["dogs"])
+        tokens = ["dogs", "cats", "dogs", "bloom"] * 3
+        for hashing in ("standard", "double"):
+            counters = SBF.create_filter(tokens, 0.01, to_bitarray=False, hashing=hashing)
+            words = ["dogs", "cats", "filter", "bloom", "spectral"]
+            expected = [counters[SBF.create_hashes(word, SBF.k, SBF.m, hashing)].min() for word in words]
+            np.testing.assert_array_equal(expected, SBF.query_many(words))
+            self.assertEqual(6, SBF.query("dogs"))
+        self.assertEqual(0, len(SBF.query_many([])))
+
+    def test_pack_counters(self):
+        counters = np.array([0, 1, 5, 15, 7], dtype=np.uint8)
+        bits = "".join(bin(c)[2:].zfill(4) for c in counters)
+        self.assertEqual(bitarray(bits).tobytes(), pack_counters(counters, 4))
+        counters = np.array([1023, 0, 513], dtype=np.uint16)
+        bits = "".join(bin(c)[2:].zfill(10) for c in counters)
+        self.assertEqual(bitarray(bits).tobytes(), pack_counters(counters, 10))
+
+class Test_Sizing(unittest.TestCase):
+    def test_choose(self):
+        self.assertEqual( (480 , 3) , choose(100, 0.1, 4)[:2] )
+        self.assertEqual( 240 , choose(100, 0.1, 4).bytes )
+        self.assertAlmostEqual( false_positive_rate(100, 480, 3) , choose(100, 0.1, 4).false_positive )
+
+    def test_byte_budget(self):
+        m , k = optimal_m_k(1000, 0.01)
+        size = choose(1000, 0.01, 4, max_bytes=1024)
+        self.assertEqual( (2048 , optimal_k(1000, 2048) , 1024) , size[:3] )
+        self.assertLess( size.k , k )
+        self.assertGreater( size.false_positive , 0.01 )
+        # Within the budget nothing changes
+        self.assertEqual( (m , k) , choose(1000, 0.01, 4, max_bytes=10**6)[:2] )
+        with self.assertRaises(ValueError):
+            choose(1000, 0.01, 4, max_bytes=0)
+
+    def test_filter_budget(self):
+        SBF = Spectral_Bloom_Filter()
+        tokens = ["word{}".format(i % 300) for i in range(1000)]
+        counter = SBF.create_filter(tokens, 0.01, chunk_size=4, to_bitarray=False, max_bytes=100)
+        self.assertEqual( (200 , choose(300, 0.01, 4, 100).k) , (len(counter) , SBF.k) )
+
+    def test_document_k(self):
+        # k of the page is the k of the filter, from the unique words
+        with tempfile.TemporaryDirectory() as tmp:
+            page = os.path.join(tmp, "a.html")
+            with open(page, "w") as f:
+                f.write("<title>bloom</title>\n<p>{}</p>".format(" ".join(["bloom"] * 50 + ["spectral", "filter"])))
+            document = generate_bloom_filter(page, false_positive=0.01)
+            self.assertEqual( optimal_m_k(3, 0.01) , (document["m"] , document["k"]) )
+
+    def test_allocate(self):
+        unique_counts = [10, 100, 1000, 5000]
+        full = [choose(n, 0.01, 4) for n in unique_counts]
+        self.assertEqual( full , allocate(unique_counts, 10**6, 0.01, 4) )
+
+        sizes = allocate(unique_counts, sum(size.bytes for size in full) // 4, 0.01, 4)
+        self.assertLessEqual( sum(size.bytes for size in sizes) , sum(size.bytes for size in full) // 4 )
+        # Small documents keep their rate, the rate of the others grows with their size
+        self.assertEqual( full[0] , sizes[0] )
+        rates = [size.false_positive for size in sizes]
+        self.assertEqual( sorted(rates) , rates )
+        # Fewer expected false positives than cutting every filter by the same factor
+        scaled = [choose(n, 0.01, 4, size.bytes // 4) for n, size in zip(unique_counts, full)]
+        self.assertLess( sum(rates) , sum(size.false_positive for size in scaled) )
+        with self.assertRaises(ValueError):
+            allocate(unique_counts, 3, 0.01, 4)
+
+    def test_total_bytes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for i in range(4):
+                with open(os.path.join(tmp, "doc{}.html".format(i)), "w") as f:
+                    f.write("<title>doc</title>\n<p>{}</p>".format(" ".join("w{}".format(j) for j in range(50 * 4**i))))
+            output_file = os.path.join(tmp, "out", "search.html")
+            os.makedirs(os.path.dirname(output_file))
+            create_search_page(tmp, output_file=output_file, false_positive=0.01, total_bytes=1000,
+                               incremental=True)
+            entries = [document["entry"] for document in load_manifest(get_manifest_path(output_file)).values()]
+            self.assertLessEqual( sum(ceil(entry[2] * entry[1] / 8) for entry in entries) , 1000 )
+            # Counts are kept in the manifest and reused while a file is unchanged
+            manifest_file = get_manifest_path(output_file)
+            documents = load_manifest(manifest_file)
+            self.assertEqual( documents[os.path.join(tmp, "doc0.html")]["no_unique_items"] , 51 )
+            documents[os.path.join(tmp, "doc0.html")]["no_unique_items"] = 1
+            save_manifest(manifest_file, documents)
+            with open(os.path.join(tmp, "doc1.html"), "w") as f:
+                f.write("<title>doc</title>\n<p>w1 w2 w3</p>")
+            create_search_page(tmp, output_file=output_file, false_positive=0.01, total_bytes=1000,
+                               incremental=True)
+            documents = load_manifest(manifest_file)
+            self.assertEqual( documents[os.path.join(tmp, "doc0.html")]["no_unique_items"] , 1 )
+            self.assertEqual( documents[os.path.join(tmp, "doc1.html")]["no_unique_items"] , 4 )
+
+
+class Test_Base2p15(unittest.TestCase):
+    def test_encode_bytes(self):
+        for bits in ["1", "0" * 15, "101100111000111100001" * 7, "1" * 31]:
+            arr = bitarray(bits)
+            expected = base2p15_encode(bits)
+            self.assertEqual(expected, base2p15_encode_bytes(arr))
+            self.assertEqual(expected, base2p15_encode_bytes(memoryview(arr.tobytes()), len(bits)))
+            padded = bitarray()
+            padded.frombytes(arr.tobytes())
+            self.assertEqual(base2p15_encode(padded.to01()), base2p15_encode_bytes(arr.tobytes()))
+
+    def test_decode_bytes(self):
+        for bits in ["1", "0" * 15, "101100111000111100001" * 7, "1" * 31]:
+            encoded = base2p15_encode(bits)
+            self.assertEqual(base2p15_decode(encoded), base2p15_decode_bytes(encoded).to01())
+
+
+class Test_Parse(unittest.TestCase):
+    def test_pipeline(self):
+        lines = ["The Cats sat", "", "on the MAT, twice"]
+        stages = [lowercase, tokenize, lambda tokens: drop_stopwords(tokens, {"the", "on"})]
+        tokens = pipeline(lines, *stages)
+        self.assertEqual(next(tokens), "cats")
+        self.assertEqual(["sat", "mat", "twice"], list(tokens))
+
+    def test_iter_tokens(self):
+        tokens = iter_tokens(["Bloom filters, Bloom!"], remove_stopwords=False)
+        self.assertEqual(["bloom", "filters", "bloom"], list(tokens))
+
+    def test_shared_resources(self):
+        self.assertIs(get_tokenizer(), get_tokenizer())
+
+        class Plural:
+            def lemmatize(self, word):
+                return word[:-1] if word.endswith("s") else word
+
+        self.assertEqual(["cat", "dog"], list(lemmatize(["cats", "dog"], Plural())))
+
+    def test_lxml_backend(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            page = os.path.join(tmp, "page.html")
+            with open(page, "w", encoding="utf8") as f:
+                f.write("<html><head><title>Spectral Blöom</title><style>p {color: red}</style></head>\n"
+                        "<body><p>Bloom filters</p>\n<script>var x = 1;</script>count\n<b>Words</b> twice\n"
+                        "<template><p>hidden</p></template>shown</body></html>")
+            self.assertEqual(extract_html_bs4(page, remove_stopwords=False),
+                             extract_html_lxml(page, remove_stopwords=False))
+            tokens, title = parse_html(page, backend="lxml", remove_stopwords=False)
+            self.assertEqual("Spectral Blöom", title)
+            tokens = list(tokens)
+            self.assertIn("count", tokens)
+            self.assertNotIn("hidden", tokens)
+            with self.assertRaises(ValueError):
+                parse_html(page, backend="regex")
+
+    def test_filter_from_generator(self):
+        SBF = Spectral_Bloom_Filter()
+        tokens = iter_tokens(["Bloom filters, Bloom!"], remove_stopwords=False)
+        counter = SBF.create_filter(tokens, 0.01, to_bitarray=False)
+        self.assertEqual(3, SBF.no_items)
+        self.assertEqual(2, SBF.no_unique_items)
+        self.assertEqual(SBF.optimal_m_k(2, 0.01)[0], len(counter))
+
+    def test_prefixes(self):
+        self.assertEqual(["blo", "bloo", "bloom", "fil", "filt", "filte"],
+                         list(prefixes(["bloom", "an", "filters"], 5)))
+        self.assertEqual(["bl", "blo"], list(prefixes(["bloom"], 3, min_length=2)))
+
+    def test_prefix_filter(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            page = os.path.join(tmp, "page.html")
+            with open(page, "w") as f:
+                f.write("<title>bloom</title>\n<p>filter filters filtering spectral</p>")
+            entry = scan_document(page, false_positive=0.01, remove_stopwords=False, prefix_length=5)
+            self.assertEqual(["fixed"], entry[8])
+            name, encoded, m, k, min_length, max_length = entry[9]
+            self.assertEqual(("prefix", 3, 5), (name, min_length, max_length))
+            packed = base2p15_decode_bytes(encoded).tobytes()
+            self.assertEqual(get_entry_sizes(entry)[1], len(packed))
+            SBF = Spectral_Bloom_Filter()
+            counters = SBF.create_filter(prefixes(["bloom", "filter", "filters", "filtering", "spectral"], 5),
+                                         0.01, to_bitarray=False)
+            self.assertEqual( (SBF.m , SBF.k , pack_counters(counters, 4)) , (m , k , packed) )
+            self.assertTrue(all(SBF.query_many(["fil", "filt", "filte", "blo", "spect"])))
+
+class Test_Manifest(unittest.TestCase):
+    def test_manifest_roundtrip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest_file = get_manifest_path(os.path.join(tmp, "search.html"))
+            self.assertEqual(os.path.join(tmp, "search.manifest.json"), manifest_file)
+            self.assertEqual({}, load_manifest(manifest_file))
+
+            page = os.path.join(tmp, "a.html")
+            with open(page, "w") as f:
+                f.write("<title>a</title>")
+            documents = {page: {"hash": hash_file(page), "params": {"chunk_size": 4},
+                                "entry": ["0\u4e00", 4, 15, 3, "a.bin", "a", 1, "standard"]}}
+            save_manifest(manifest_file, documents)
+            self.assertEqual(documents, load_manifest(manifest_file))
+
+            with open(page, "a") as f:
+                f.write("<p>changed</p>")
+            self.assertNotEqual(documents[page]["hash"], hash_file(page))
+
+    def test_incremental_build(self):
+        with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as out:
+            pages = [os.path.join(tmp, "doc{}.html".format(i)) for i in range(3)]
+            for i, page in enumerate(pages):
+                with open(page, "w") as f:
+                    f.write("<title>doc{}</title>\n<p>bloom filter {}</p>".format(i, "word " * i))
+            output_file = os.path.join(out, "search.html")
+            create_search_page(tmp, output_file=output_file, incremental=True)
+
+            with open(pages[1], "w") as f:
+                f.write("<title>edited</title>\n<p>spectral counters</p>")
+            os.remove(pages[2])
+            log = io.StringIO()
+            with redirect_stdout(log):
+                create_search_page(tmp, output_file=output_file, incremental=True)
+            self.assertIn("Unchanged: {}".format(pages[0]), log.getvalue())
+            self.assertIn("Scanned: {}".format(os.path.splitext(pages[1])[0]), log.getvalue())
+            self.assertNotIn(os.path.splitext(pages[2])[0], log.getvalue())
+            documents = load_manifest(get_manifest_path(output_file))
+            self.assertEqual( sorted(documents) , pages[:2] )
+            self.assertEqual( documents[pages[1]]["hash"] , hash_file(pages[1]) )
+
+            # The page is the same as a full build's
+            full_file = os.path.join(out, "full.html")
+            create_search_page(tmp, output_file=full_file)
+            with open(output_file, encoding="utf8") as f, open(full_file, encoding="utf8") as full:
+                page = f.read()
+                self.assertEqual( full.read() , page )
+            self.assertIn("edited", page)
+            self.assertNotIn(os.path.splitext(pages[2])[0], page)
+
+
+class Test_Jobs(unittest.TestCase):
+    def test_parallel_build(self):
+        with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as out:
+            for i in range(6):
+                with open(os.path.join(tmp, "doc{}.html".format(i)), "w") as f:
+                    f.write("<title>doc{}</title>\n<p>{}</p>".format(i, " ".join("w{}".format(j) for j in range(i, 20 * i))))
+            for options in [{}, {"total_bytes": 400, "df_sketch": True, "prefix_length": 4}]:
+                pages = []
+                for jobs in [1, 2]:
+                    output_file = os.path.join(out, "search{}.html".format(jobs))
+                    create_search_page(tmp, output_file=output_file, jobs=jobs, **options)
+                    with open(output_file, "rb") as f:
+                        pages.append(f.read())
+                self.assertEqual( pages[0] , pages[1] )
+
+
+class Test_Shards(unittest.TestCase):
+    def test_write_shards(self):
+        entries = [["0\u4e00", 4, 15, 3, "doc{}.bin".format(i), "Doc", 1, "standard"] for i in range(5)]
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = os.path.join(tmp, "search.html")
+            manifest = write_shards(entries, output_file, 2)
+            self.assertEqual(5, manifest["documents"])
+            self.assertEqual([2, 2, 1], [shard["documents"] for shard in manifest["shards"]])
+            self.assertEqual("search_shards/shard_0000.json", manifest["shards"][0]["file"])
+
+            loaded = []
+            for shard in manifest["shards"]:
+                with open(os.path.join(tmp, shard["file"]), encoding="utf8") as f:
+                    loaded.extend(json.load(f))
+            self.assertEqual(entries, loaded)
+
+            # Rebuilding with bigger shards removes the stale shard files
+            write_shards(entries, output_file, 5)
+            self.assertEqual(["shard_0000.json"], os.listdir(os.path.join(tmp, "search_shards")))
+
+    def test_compress_documents(self):
+        filters = [b"\x12\x00\x00\x00\x00\x00\x00\x34", b"\xff\x01"]
+        entries = [[base2p15_encode_bytes(data), 4, 2 * len(data), 3, "doc.bin", "Doc", 1, "standard"] for data in filters]
+        blob = gzip.decompress(compress_documents(entries))
+        header = int.from_bytes(blob[:4], "big")
+        self.assertEqual([[len(data)] + entry[1:] for data, entry in zip(filters, entries)],
+                         json.loads(blob[4:4 + header].decode("utf8")))
+        self.assertEqual(b"".join(filters), blob[4 + header:])
+        self.assertEqual(compress_documents(entries), compress_documents(entries))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = write_shards(entries, os.path.join(tmp, "search.html"), 1, compress=True)
+            self.assertEqual("gzip", manifest["compression"])
+            self.assertEqual("search_shards/shard_0001.gz", manifest["shards"][1]["file"])
+
+
+class Test_Bit_Sliced(unittest.TestCase):
+    def test_group_documents(self):
+        groups = group_documents([10, 5000, 11, 12, 4000], 0.01)
+        self.assertEqual([[0, 2, 3], [1, 4]], groups)
+
+    def test_bit_slice(self):
+        counters = np.array([[5, 0, 15], [1, 2, 3]], dtype=np.uint8)
+        encoded = bit_slice(counters, 4)
+        rows = base2p15_decode_bytes(encoded).to01()
+        # One character per row: 2 documents padded to 15 bits
+        self.assertEqual(1 + 3 * 4, len(encoded))
+        for j in range(3):
+            for b in range(4):
+                row = rows[(j * 4 + b) * 15:(j * 4 + b + 1) * 15]
+                expected = "".join(str((int(c) >> (3 - b)) & 1) for c in counters[:, j])
+                self.assertEqual(expected + "0" * 13, row)
+
+    def test_build_groups(self):
+        SBF = Spectral_Bloom_Filter()
+        token_counts = [Counter({"dogs": 3, "cats": 1}), Counter({"cats": 2, "bloom": 1})]
+        [(docs, entry)] = build_groups(token_counts, 0.01)
+        self.assertEqual([0, 1], docs)
+        m, k = SBF.optimal_m_k(2, 0.01)
+        self.assertEqual([4, m, k, "standard", [4, 3]], entry[1:])
+        counters = np.stack([SBF.create_counters(tokens, m, k) for tokens in token_counts])
+        self.assertEqual(bit_slice(counters, 4), entry[0])
+
+    def test_invalid_layout(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "doc.html"), "w") as f:
+                f.write("<title>doc</title>\n<p>words</p>")
+            output_file = os.path.join(tmp, "search.html")
+            for options in [{"shard_size": 2}, {"compress": True}, {"prefix_length": 5, "df_sketch": True}]:
+                with self.assertRaises(ValueError):
+                    create_search_page(tmp, output_file=output_file, layout="bitsliced", **options)
+            with self.assertRaises(ValueError):
+                create_search_page(tmp, output_file=output_file, layout="columns")
+            self.assertFalse(os.path.exists(output_file))
+
+
+class Test_Variable_Counters(unittest.TestCase):
+    def test_gamma_encode(self):
+        # 0 -> 1, 1 -> 010, 2 -> 011, 6 -> 00111
+        data , n_bits = gamma_encode(np.array([0, 1, 2, 6], dtype=np.uint8))
+        self.assertEqual(12, n_bits)
+        self.assertEqual(bitarray("101001100111"), base2p15_decode_bytes(base2p15_encode_bytes(data, n_bits)))
+
+    def test_gamma_roundtrip(self):
+        counters = np.random.default_rng(0).geometric(0.6, 1000).astype(np.uint16) - 1
+        counters[17] = 1023
+        data , _ = gamma_encode(counters)
+        np.testing.assert_array_equal(counters, gamma_decode(data, len(counters)))
+        bits = bitarray(endian="big")
+        bits.frombytes(data)
+        np.testing.assert_array_equal(counters, gamma_decode(bits, len(counters)))
+
+        offsets = block_offsets(counters, 64)
+        self.assertEqual(16, len(offsets))
+        reader = GammaCounters(data, len(counters), offsets, 64)
+        self.assertEqual([int(c) for c in counters[::-1]], [reader[i] for i in range(999, -1, -1)])
+
+    def test_encode_index(self):
+        index , width = encode_index(np.array([0, 70, 130]))
+        self.assertEqual(8, width)
+        self.assertEqual(bitarray("000000000100011010000010"), base2p15_decode_bytes(index))
+
+    def test_elias_filter(self):
+        SBF = Spectral_Bloom_Filter()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "document.bin")
+            counters = SBF.create_filter(["dogs", "cats", "dogs"], 0.01, bitarray_path=path, counter_format="elias")
+            with open(path, "rb") as f:
+                np.testing.assert_array_equal(counters, gamma_decode(f.read(), len(counters)))
+        with self.assertRaises(ValueError):
+            SBF.create_filter(["dogs"], 0.01, to_bitarray=False, counter_format="rice")
+
+
+class Test_Search_Index(unittest.TestCase):
+    def entry(self, tokens, chunk_size=4, hashing="standard"):
+        SBF = Spectral_Bloom_Filter()
+        m , k = SBF.optimal_m_k(len(tokens), 0.01)
+        counters = SBF.create_counters(tokens, m, k, chunk_size, hashing)
+        data = pack_counters(counters, chunk_size)
+        return [base2p15_encode_bytes(data), chunk_size, m, k, "doc.bin", "Doc", sum(tokens.values()), hashing], counters
+
+    def test_index_roundtrip(self):
+        docs = [self.entry(Counter({"dogs": 3, "cats": 1})),
+                self.entry(Counter({"cats": 2, "bloom": 5}), chunk_size=7, hashing="double")]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "search.idx")
+            write_index([entry for entry, _ in docs], path)
+            with SearchIndex(path) as index:
+                self.assertEqual(2, len(index))
+                self.assertEqual(["doc.html", "doc.html"], index.urls)
+                for doc, (_, counters) in enumerate(docs):
+                    np.testing.assert_array_equal(counters, index.counters(doc))
+
+    def test_query(self):
+        SBF = Spectral_Bloom_Filter()
+        tokens = [Counter({"dogs": 3, "cats": 1}), Counter({"cats": 2, "bloom": 5}), Counter({"filter": 4})]
+        docs = [self.entry(counts) for counts in tokens]
+        for doc, (entry, _) in enumerate(docs):
+            entry[4] = "doc{}.bin".format(doc)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "search.idx")
+            write_index([entry for entry, _ in docs], path)
+            with SearchIndex(path) as index:
+                # Running sum of the smallest counter of every word over no_items
+                expected = [
+                    np.cumsum([counters[SBF.create_hashes(word, entry[3], entry[2])].min() / entry[6] for word in ["dogs", "bloom"]])
+                    for entry, counters in docs
+                ]
+                np.testing.assert_allclose(expected, index.tf_scores(["dogs", "bloom"]))
+
+                # tf * log10(N / documents with the word)
+                results = index.search("Cats")
+                tf = [counters[SBF.create_hashes("cats", entry[3], entry[2])].min() / entry[6] for entry, counters in docs]
+                self.assertEqual(["doc0.html", "doc1.html"], sorted(url for _, _, url in results))
+                self.assertAlmostEqual(max(tf) * np.log10(3 / 2), results[0][0])
+                self.assertEqual([], index.search("dogs cats bloom filter"))
+                # Spaces typed around the words do not make empty words
+                self.assertEqual(results, index.search("  cats "))
+                self.assertEqual([], index.search(" "))
+                self.assertEqual(results[:1], index.search("cats", limit=1))
+
+class Test_DF_Sketch(unittest.TestCase):
+    def test_vocabulary(self):
+        self.assertEqual(["blo*", "bloo*", "bloom", "bloom*", "blooms", "blooms*", "cat", "cat*"],
+                         vocabulary(["blooms", "cat", "bloom", "cat"], 6))
+        self.assertEqual(["bloom", "cat"], vocabulary(["cat", "bloom", "cat"]))
+
+    def test_estimate(self):
+        vocabularies = [vocabulary("word{}".format(j) for j in range(i, 3 * i + 10)) for i in range(40)]
+        frequencies = Counter(word for words in vocabularies for word in words)
+        self.assertEqual( sketch_shape(len(vocabularies)) , (13592 , 4 , 6) )
+        self.assertEqual( sketch_shape(len(vocabularies), epsilon=1e-9)[0] , 2**16 )
+        # Fewer counters per row than words
+        width, depth, bits = len(frequencies) // 2, 4, 6
+        counters = build_sketch(vocabularies, width, depth, bits)
+        words = sorted(frequencies)
+        estimates = estimate(counters, width, depth, words)
+        # Never below the document frequency
+        self.assertTrue(all(estimates >= [frequencies[word] for word in words]))
+        # The default width leaves most words exact
+        width = sketch_shape(len(vocabularies))[0]
+        counters = build_sketch(vocabularies, width, depth, bits)
+        exact = estimate(counters, width, depth, words) == [frequencies[word] for word in words]
+        self.assertGreater(exact.mean(), 0.9)
+
+        entry = encode_sketch(counters, width, depth, bits, len(vocabularies))
+        self.assertEqual([width, depth, bits, 40, 0, 0], entry[1:])
+        self.assertEqual(pack_counters(counters, bits), base2p15_decode_bytes(entry[0]).tobytes())
+
+    def test_search_page(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for i in range(3):
+                with open(os.path.join(tmp, "doc{}.html".format(i)), "w") as f:
+                    f.write("<title>doc</title>\n<p>{}</p>".format(" ".join("w{}".format(j) for j in range(i, 10))))
+            output_file = os.path.join(tmp, "search.html")
+            create_search_page(tmp, output_file=output_file, false_positive=0.01, df_sketch=True)
+            with open(output_file, encoding="utf8") as f:
+                self.assertIn("df_sketch = [", f.read())
+
+    def test_incremental(self):
+        with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as out:
+            for i in range(3):
+                with open(os.path.join(tmp, "doc{}.html".format(i)), "w") as f:
+                    f.write("<title>doc</title>\n<p>{}</p>".format(" ".join("w{}".format(j) for j in range(i, 10))))
+            output_file = os.path.join(out, "search.html")
+            create_search_page(tmp, output_file=output_file, incremental=True, df_sketch=True)
+            # Vocabularies are kept in the manifest and reused while a file is unchanged
+            manifest_file = get_manifest_path(output_file)
+            documents = load_manifest(manifest_file)
+            self.assertEqual( documents[os.path.join(tmp, "doc2.html")]["vocabulary"] , vocabulary(["doc"] + ["w{}".format(j) for j in range(2, 10)]) )
+            documents[os.path.join(tmp, "doc0.html")]["vocabulary"] = ["cached"]
+            save_manifest(manifest_file, documents)
+            with open(os.path.join(tmp, "doc1.html"), "w") as f:
+                f.write("<title>doc</title>\n<p>edited</p>")
+            create_search_page(tmp, output_file=output_file, incremental=True, df_sketch=True)
+            documents = load_manifest(manifest_file)
+            self.assertEqual( documents[os.path.join(tmp, "doc0.html")]["vocabulary"] , ["cached"] )
+            self.assertEqual( documents[os.path.join(tmp, "doc1.html")]["vocabulary"] , ["doc", "edited"] )
+
+
+class Test_Accuracy(unittest.TestCase):
+    def test_evaluate(self):
+        estimates = np.array([2, 3, 0, 1, 7, 7])
+        counts = np.array([2, 1, 0, 0, 9, 7])
+        # chunk_size 3 saturates at 7: the word seen 9 times is counted right
+        self.assertEqual((4, 1, 2, 1), evaluate(estimates, counts, 3))
+
+    def test_resume(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            files = []
+            for doc, text in enumerate(["spectral bloom filters count words", "the bloom filter of a static site"]):
+                files.append(os.path.join(tmp, "doc{}.html".format(doc)))
+                with open(files[-1], "w", encoding="utf8") as f:
+                    f.write("<html><body><p>{}</p></body></html>".format(text))
+            results = os.path.join(tmp, "results.csv")
+
+            rows = run(files, [Config(0.1, 4, "standard")], results, remove_stopwords=False)
+            self.assertEqual(2, len(rows))
+            # Every word of resources/english_dict.txt is queried
+            self.assertEqual(20000, rows[0]["seen_words"] + rows[0]["unseen_words"])
+
+            # Only the new configurations are evaluated, the results file has them all
+            configs = grid([0.1, 0.01], [4], ["standard", "double"])
+            rows = run(files, configs, results, remove_stopwords=False)
+            self.assertEqual(8, len(rows))
+            with open(get_checkpoint_path(results), encoding="utf8") as f:
+                self.assertEqual(8, len(f.readlines()))
+            with open(results, encoding="utf8") as f:
+                self.assertEqual(9, len(f.readlines()))
+            self.assertEqual([(0.1, "standard")] * 2 + [(0.1, "double")] * 2,
+                             [(row["fp_rate"], row["hashing"]) for row in rows[:4]])
+
+            # An edited file and other tokenization flags are evaluated again
+            with open(files[1], "w", encoding="utf8") as f:
+                f.write("<html><body><p>bloom bloom bloom</p></body></html>")
+            rows = run(files, configs, results, remove_stopwords=False)
+            with open(get_checkpoint_path(results), encoding="utf8") as f:
+                self.assertEqual(12, len(f.readlines()))
+            self.assertEqual( 1 , rows[1]["unique_tokens"] )
+            run(files, configs, results, remove_stopwords=True)
+            with open(get_checkpoint_path(results), encoding="utf8") as f:
+                self.assertEqual(20, len(f.readlines()))
+
+
 if __name__ == '__main__':
     unittest.main()
 
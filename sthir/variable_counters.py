@@ -0,0 +1,139 @@
+"""
+Variable length counters for Spectral Bloom Filters.
+
+Most counters of a filter are 0 or 1, so storing each one with a fixed
+chunk_size wastes space. Here every counter c is written as the Elias gamma
+code of c + 1: N zeros followed by the N + 1 bits of c + 1, where
+N = floor(log2(c + 1)). A 0 takes 1 bit, 1 and 2 take 3 bits, 3 to 6 take 5 bits.
+
+Random access uses a secondary index in the spirit of the string-array index
+of the paper: the bit offset of every block of block_size counters is
+stored with a fixed width, so reading a counter decodes at most one block.
+
+|  Paper: SIGMOD '03: Proceedings of the 2003 ACM SIGMOD international conference on Management of data, June 2003 Pages 241–252
+|  DOI: https://doi.org/10.1145/872757.872787
+"""
+from typing import Tuple, Union
+
+import numpy as np
+from bitarray import bitarray
+
+from sthir.generate_search import base2p15_encode_bytes
+
+# Counters per block of the secondary index
+BLOCK_SIZE = 64
+
+
+def gamma_lengths(counters: np.ndarray) -> np.ndarray:
+    """
+    Returns the number of bits of the gamma code of every counter
+    """
+    values = counters.astype(np.uint64) + 1
+    # frexp gives values = mantissa * 2**exponent with 0.5 <= mantissa < 1
+    exponents = np.frexp(values.astype(np.float64))[1].astype(np.int64) - 1
+    return 2 * exponents + 1
+
+
+def gamma_encode(counters: np.ndarray) -> Tuple[bytes, int]:
+    """
+    Encodes the counters as a stream of Elias gamma codes of counter + 1
+
+    :param counters: Array of counters
+    :returns: The packed bits (big-endian, zero padded to a byte) and the number of bits used
+    """
+    values = counters.astype(np.uint64) + 1
+    lengths = gamma_lengths(counters)
+    ends = np.cumsum(lengths)
+    n_bits = int(ends[-1]) if len(ends) else 0
+
+    # The code of v is v itself written on 2N+1 bits
+    bits = np.zeros(n_bits, dtype=np.uint8)
+    top = (lengths - 1) // 2
+    for t in range(int(top.max()) + 1 if len(top) else 0):
+        set_bits = (top >= t) & (((values >> np.uint64(t)) & np.uint64(1)) == 1)
+        bits[ends[set_bits] - 1 - t] = 1
+    return np.packbits(bits).tobytes(), n_bits
+
+
+def gamma_decode(data: Union[bytes, bitarray], m: int, start: int = 0) -> np.ndarray:
+    """
+    Decodes m counters from a stream of gamma codes
+
+    :param data: Packed bits, as returned by gamma_encode, or a big-endian bitarray of them
+    :param m: Number of counters to decode
+    :param start: Bit offset of the first code
+    :returns: Array of m counters
+    """
+    if isinstance(data, bitarray):
+        bits = data
+    else:
+        bits = bitarray(endian="big")
+        bits.frombytes(bytes(data))
+    counters = np.zeros(m, dtype=np.uint32)
+    position = start
+    for i in range(m):
+        zeros = bits.index(1, position) - position
+        value = 0
+        for bit in bits[position + zeros:position + 2 * zeros + 1]:
+            value = (value << 1) | bit
+        counters[i] = value - 1
+        position += 2 * zeros + 1
+    return counters
+
+
+def block_offsets(counters: np.ndarray, block_size: int = BLOCK_SIZE) -> np.ndarray:
+    """
+    Returns the bit offset of the first code of every block of block_size counters
+    """
+    starts = np.concatenate(([0], np.cumsum(gamma_lengths(counters))))
+    return starts[:len(counters):block_size]
+
+
+def encode_index(offsets: np.ndarray) -> Tuple[str, int]:
+    """
+    Encodes block offsets with the smallest fixed width that fits the largest one
+
+    :returns: The base2p15 encoded offsets and their width in bits
+    """
+    width = max(int(offsets.max()).bit_length(), 1) if len(offsets) else 1
+    shifts = np.arange(width - 1, -1, -1, dtype=np.uint64)
+    bits = (offsets.astype(np.uint64)[:, None] >> shifts) & np.uint64(1)
+    packed = np.packbits(bits.astype(np.uint8)).tobytes()
+    return base2p15_encode_bytes(packed, len(offsets) * width), width
+
+
+class GammaCounters:
+    """
+    Random access to gamma coded counters through the block index.
+
+    Example
+    --------
+        >>> data, _ = gamma_encode(counters)
+        >>> reader = GammaCounters(data, len(counters), block_offsets(counters))
+        >>> reader[10] == counters[10]
+        True
+    """
+    def __init__(self, data: bytes, m: int, offsets: np.ndarray, block_size: int = BLOCK_SIZE):
+        self.data = data
+        # Unpacked once, blocks are decoded from it without copying the data
+        self.bits = bitarray(endian="big")
+        self.bits.frombytes(bytes(data))
+        self.m = m
+        self.offsets = offsets
+        self.block_size = block_size
+        self.blocks = dict()
+
+    def block(self, number: int) -> np.ndarray:
+        """
+        Returns the decoded counters of a block, decoding it on first use
+        """
+        if number not in self.blocks:
+            size = min(self.block_size, self.m - number * self.block_size)
+            self.blocks[number] = gamma_decode(self.bits, size, int(self.offsets[number]))
+        return self.blocks[number]
+
+    def __getitem__(self, i: int) -> int:
+        return int(self.block(i // self.block_size)[i % self.block_size])
+
+    def __len__(self) -> int:
+        return self.m